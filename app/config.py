@@ -1,26 +1,67 @@
 import os
-from dotenv import load_dotenv
-from pydantic_settings import BaseSettings
-
-load_dotenv()
+from functools import lru_cache
+from pydantic import Field, ValidationInfo, field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
+    # Values come from the environment or .env; each field binds to the
+    # upper-cased variable of the same name (e.g. SUPABASE_URL)
+    model_config = SettingsConfigDict(env_file=".env", frozen=True, extra="ignore")
+    
+    # Development mode: request/response logging middleware
+    debug: bool = False
+    
     # Supabase Configuration
-    supabase_url: str = os.getenv("SUPABASE_URL", "")
-    supabase_key: str = os.getenv("SUPABASE_KEY", "")
-    supabase_service_key: str = os.getenv("SUPABASE_SERVICE_KEY", "")
+    supabase_url: str = ""
+    supabase_key: str = ""
+    supabase_service_key: str = ""
     
     # Google Gemini Configuration
-    google_api_key: str = os.getenv("GOOGLE_API_KEY", "")
+    google_api_key: str = ""
     
     # Storage Configuration
-    storage_bucket_name: str = os.getenv("STORAGE_BUCKET_NAME", "trustbooks-files")
+    storage_bucket_name: str = "trustbooks-files"
     
     # File upload settings
     max_file_size: int = 10 * 1024 * 1024  # 10MB
-    allowed_file_types: list = [".pdf", ".csv", ".xlsx", ".xls"]
+    allowed_file_types: tuple = (".pdf", ".csv", ".xlsx", ".xls")
+    
+    # Parse queue; with no Redis URL, parsing runs in the API process
+    redis_url: str = ""
+    parse_queue_max_jobs: int = 16
+    # Where uploads wait to be parsed; must be shared with the queue
+    # workers (empty means the system temp directory)
+    upload_spool_dir: str = ""
+    
+    # Rows per PostgREST bulk write request
+    bulk_chunk_size: int = 1000
     
-    class Config:
-        env_file = ".env"
+    # API server processes when not in debug mode; each runs its own
+    # parser pool
+    server_workers: int = Field(default_factory=lambda: os.cpu_count() or 1)
+    
+    # Set by main.py for the processes of its multi-process server; the
+    # arq worker and a debug server have the CPUs to themselves
+    multiprocess_server: bool = False
+    
+    # Worker processes for CPU-bound statement parsing, per process; 0 (the
+    # default) uses every CPU, split evenly between the processes of a
+    # multi-process server
+    parser_workers: int = Field(default=0, validate_default=True)
+    
+    @field_validator("parser_workers")
+    @classmethod
+    def split_cpus(cls, value: int, info: ValidationInfo) -> int:
+        if value > 0:
+            return value
+        cpus = os.cpu_count() or 1
+        if not info.data.get("multiprocess_server"):
+            return cpus
+        return max(1, cpus // max(1, info.data.get("server_workers", 1)))
+
+@lru_cache
+def get_settings() -> Settings:
+    """Return the process-wide settings, reading the environment only once"""
+    return Settings()
 
-settings = Settings() 
\ No newline at end of file
+settings = get_settings()
@@ -1,91 +1,466 @@
-from supabase import create_client, Client
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import quote
+import httpx
+import orjson
+import pandas as pd
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
 from app.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# PostgREST rejects very large request bodies, so bulk writes are split
+# into chunks of this many rows.
+BULK_CHUNK_SIZE = settings.bulk_chunk_size
+
+# Chunks of one bulk write that may be in flight at the same time; kept
+# well below the connection pool size so other requests are not starved
+BULK_MAX_CONCURRENCY = 4
+
+# How long the insert coalescer waits for more rows before flushing.
+COALESCE_WINDOW_SECONDS = 0.005
+
+# Upper bound on memoised public file URLs.
+URL_CACHE_SIZE = 4096
+
+# Bytes read per chunk when a file is streamed to storage.
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# One keep-alive pool shared by every request; HTTP/2 lets concurrent
+# calls multiplex over the same TLS session.
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40)
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+# Consecutive failed Supabase calls that open the circuit breaker, and how
+# many seconds it stays open before one trial call is let through.
+BREAKER_FAIL_MAX = 10
+BREAKER_RESET_TIMEOUT = 30.0
+
+# Requests that can be re-sent after any connection-level failure.  Other
+# methods (the POST inserts, RPCs and uploads) may already have been
+# applied when e.g. a read times out, so they are only retried on errors
+# raised before the request was sent.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "PATCH", "DELETE"})
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+class ServiceUnavailableError(Exception):
+    """Raised without contacting Supabase while the circuit breaker is open"""
+
+def _is_outage(error: Exception) -> bool:
+    """Whether an error means Supabase itself is unhealthy, as opposed to a bad request"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+def _chunked(rows: Union[List[dict], pd.DataFrame],
+             size: int = BULK_CHUNK_SIZE) -> Iterator[Union[List[dict], pd.DataFrame]]:
+    """Yield successive slices of at most ``size`` rows"""
+    for start in range(0, len(rows), size):
+        if isinstance(rows, pd.DataFrame):
+            yield rows.iloc[start:start + size]
+        else:
+            yield rows[start:start + size]
+
+def _rows_json(rows: Union[List[dict], pd.DataFrame]) -> Any:
+    """JSON payload for a slice of rows, ready to be passed to orjson.dumps"""
+    if isinstance(rows, pd.DataFrame):
+        # Frames are encoded by pandas straight from their columns, without
+        # building a dict per row, and orjson embeds the result as is.
+        # NaN cells are written as null
+        return orjson.Fragment(rows.to_json(
+            orient="records", date_format="iso", double_precision=15, force_ascii=False
+        ))
+    return rows
+
+def _column_names(rows: Union[List[dict], pd.DataFrame]) -> str:
+    """Comma-separated names of every column present in a slice of rows"""
+    columns = rows.columns if isinstance(rows, pd.DataFrame) else set().union(*rows)
+    return ",".join(sorted(columns))
+
+class FileStream:
+    """Request body that streams a seekable file in chunks.
+
+    Iterating starts again from the beginning of the file, so a retried
+    request resends the whole body rather than what was left of it.
+    """
+    
+    def __init__(self, file: BinaryIO, chunk_size: int = UPLOAD_CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+    
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        self.file.seek(0)
+        # Large uploads are spooled to disk, so reads happen off the loop
+        while chunk := await asyncio.to_thread(self.file.read, self.chunk_size):
+            yield chunk
+
+class InsertCoalescer:
+    """Collects single-row inserts issued within a short tick window and
+    flushes them to Supabase as one multi-row request (DataLoader pattern).
+
+    Rows are grouped per table and per key set, since a PostgREST bulk
+    insert requires every object in the payload to share the same keys.
+    A failed flush fails every caller whose row was part of it.
+    """
+
+    def __init__(self, manager: "DatabaseManager", window: float = COALESCE_WINDOW_SECONDS):
+        self._manager = manager
+        self._window = window
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def insert(self, table: str, row: dict) -> Optional[dict]:
+        """Queue a row for insertion and wait until its batch is flushed"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((table, row, future))
+        return await future
+
+    async def close(self):
+        """Stop the background flush task"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            # Give concurrent callers one tick to join this batch
+            await asyncio.sleep(self._window)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[str, dict, asyncio.Future]]):
+        groups: Dict[Tuple[str, Tuple[str, ...]], list] = {}
+        for table, row, future in batch:
+            groups.setdefault((table, tuple(sorted(row))), []).append((row, future))
+
+        for (table, _), entries in groups.items():
+            rows = [row for row, _ in entries]
+            try:
+                inserted = await self._manager._insert_rows(table, rows)
+            except Exception as e:
+                for _, future in entries:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            by_id = {record.get("id"): record for record in inserted}
+            for row, future in entries:
+                if not future.done():
+                    future.set_result(by_id.get(row.get("id")))
+
+class CircuitBreaker:
+    """Fails calls fast once Supabase has failed ``fail_max`` times in a row.
+
+    While open, calls raise ``ServiceUnavailableError`` immediately instead
+    of queueing behind dead connections.  After ``reset_timeout`` seconds a
+    single trial call is let through while every other call keeps failing
+    fast; one more failure re-opens the circuit.
+    """
+
+    def __init__(self, fail_max: int = BREAKER_FAIL_MAX, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    def before_call(self):
+        if self._trial_in_flight:
+            raise ServiceUnavailableError("Supabase is unavailable (circuit half-open)")
+        if self._opened_at is None:
+            return
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            raise ServiceUnavailableError("Supabase is unavailable (circuit open)")
+        # Half-open: admit this call as the trial; the next failure opens it again
+        self._opened_at = None
+        self._failures = self.fail_max - 1
+        self._trial_in_flight = True
+
+    def record_success(self):
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self._failures += 1
+        if self._failures >= self.fail_max:
+            logger.error(f"Opening Supabase circuit breaker after {self._failures} consecutive failures")
+            self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Let the next call try again after a call ended without a verdict"""
+        self._trial_in_flight = False
+
 class DatabaseManager:
+    """Async access to Supabase's PostgREST and Storage APIs over a single
+    pooled ``httpx.AsyncClient``"""
+
     def __init__(self):
-        self.supabase: Client = None
+        self.client: httpx.AsyncClient = None
+        self.coalescer = InsertCoalescer(self)
+        self.breaker = CircuitBreaker()
+        self._url_cache: Dict[str, str] = {}
         self._connect()
     
     def _connect(self):
-        """Initialize Supabase connection"""
+        """Initialize the shared Supabase HTTP client"""
         try:
-            self.supabase = create_client(
-                settings.supabase_url,
-                settings.supabase_key
+            self.client = httpx.AsyncClient(
+                base_url=settings.supabase_url,
+                headers={
+                    "apikey": settings.supabase_key,
+                    "Authorization": f"Bearer {settings.supabase_key}",
+                },
+                limits=HTTP_LIMITS,
+                timeout=HTTP_TIMEOUT,
+                http2=True,
             )
             logger.info("Successfully connected to Supabase")
         except Exception as e:
             logger.error(f"Failed to connect to Supabase: {e}")
             raise
     
-    def upload_file(self, file_path: str, file_content: bytes, content_type: str = None):
-        """Upload file to Supabase storage"""
+    async def close(self):
+        """Release pooled connections; called on application shutdown"""
+        await self.coalescer.close()
+        await self.client.aclose()
+    
+    async def _rest(self, method: str, table: str, json: Any = None,
+                    params: Dict[str, str] = None, prefer: str = "return=representation") -> List[dict]:
+        """Issue a PostgREST request and return the affected rows"""
+        headers = {"Prefer": prefer}
+        content = None
+        if json is not None:
+            # orjson handles datetimes natively and writes NaN as null
+            content = orjson.dumps(json)
+            headers["Content-Type"] = "application/json"
+        response = await self._send(
+            method,
+            f"/rest/v1/{table}",
+            content=content,
+            params=params,
+            headers=headers,
+        )
+        return orjson.loads(response.content) if response.content else []
+    
+    async def rpc(self, function: str, params: Dict[str, Any]) -> Any:
+        """Call a Postgres function exposed by PostgREST"""
+        response = await self._send(
+            "POST",
+            f"/rest/v1/rpc/{function}",
+            content=orjson.dumps(params),
+            headers={"Content-Type": "application/json"},
+        )
+        return orjson.loads(response.content) if response.content else None
+    
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request through the circuit breaker and raise on error statuses"""
+        self.breaker.before_call()
+        try:
+            response = await self._request_with_retry(method, url, **kwargs)
+            response.raise_for_status()
+        except Exception as e:
+            if _is_outage(e):
+                self.breaker.record_failure()
+            else:
+                # Supabase answered, so it is up even though the request failed
+                self.breaker.record_success()
+            raise
+        except BaseException:
+            # Cancelled before Supabase answered
+            self.breaker.release_trial()
+            raise
+        self.breaker.record_success()
+        return response
+    
+    async def _request_with_retry(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Retry connection-level failures with exponential backoff"""
+        retryable = httpx.TransportError if method in IDEMPOTENT_METHODS else UNSENT_ERRORS
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(3),
+            wait=wait_exponential(multiplier=0.1, max=2),
+            retry=retry_if_exception_type(retryable),
+            reraise=True,
+        ):
+            with attempt:
+                return await self.client.request(method, url, **kwargs)
+    
+    async def upload_file(self, file_path: str, file: BinaryIO, size: int, content_type: str = None):
+        """Upload file to Supabase storage, streaming it from ``file``"""
         try:
-            response = self.supabase.storage.from_(settings.storage_bucket_name).upload(
-                path=file_path,
-                file=file_content,
-                file_options={"content-type": content_type} if content_type else None
+            response = await self._send(
+                "POST",
+                f"/storage/v1/object/{settings.storage_bucket_name}/{quote(file_path)}",
+                content=FileStream(file),
+                # A known length keeps the body from being sent chunked
+                headers={
+                    "Content-Type": content_type or "application/octet-stream",
+                    "Content-Length": str(size),
+                },
             )
-            return response
+            self.invalidate_url(file_path)
+            return orjson.loads(response.content)
         except Exception as e:
             logger.error(f"Failed to upload file {file_path}: {e}")
             raise
     
     def get_file_url(self, file_path: str):
         """Get public URL for uploaded file"""
-        try:
-            response = self.supabase.storage.from_(settings.storage_bucket_name).get_public_url(file_path)
-            return response
-        except Exception as e:
-            logger.error(f"Failed to get file URL for {file_path}: {e}")
-            raise
+        url = self._url_cache.get(file_path)
+        if url is None:
+            url = (
+                f"{settings.supabase_url.rstrip('/')}/storage/v1/object/public/"
+                f"{settings.storage_bucket_name}/{quote(file_path)}"
+            )
+            if len(self._url_cache) >= URL_CACHE_SIZE:
+                # Evict the oldest entry (dicts keep insertion order)
+                self._url_cache.pop(next(iter(self._url_cache)))
+            self._url_cache[file_path] = url
+        return url
     
-    def insert_invoice(self, invoice_data: dict):
+    def invalidate_url(self, file_path: str):
+        """Drop a cached public URL, e.g. after the file is re-uploaded"""
+        self._url_cache.pop(file_path, None)
+    
+    async def insert_invoice(self, invoice_data: dict):
         """Insert invoice record into database"""
         try:
-            response = self.supabase.table("invoices").insert(invoice_data).execute()
-            return response.data[0] if response.data else None
+            data = await self._rest("POST", "invoices", json=invoice_data)
+            return data[0] if data else None
         except Exception as e:
             logger.error(f"Failed to insert invoice: {e}")
             raise
     
-    def insert_bank_statement(self, statement_data: dict):
+    async def insert_bank_statement(self, statement_data: dict):
         """Insert bank statement record into database"""
         try:
-            response = self.supabase.table("bank_statements").insert(statement_data).execute()
-            return response.data[0] if response.data else None
+            data = await self._rest("POST", "bank_statements", json=statement_data)
+            return data[0] if data else None
         except Exception as e:
             logger.error(f"Failed to insert bank statement: {e}")
             raise
     
-    def update_invoice_status(self, invoice_id: str, status: str, parsed_data: dict = None):
+    async def insert_bank_statements_bulk(self, rows: Union[List[dict], pd.DataFrame],
+                                          returning: bool = True) -> List[dict]:
+        """Insert many bank statement records using one request per chunk"""
+        return await self._insert_rows("bank_statements", rows, returning)
+    
+    async def queue_insert(self, table: str, row: dict) -> Optional[dict]:
+        """Insert a single row, coalesced with concurrent inserts into one request"""
+        return await self.coalescer.insert(table, row)
+    
+    async def _insert_rows(self, table: str, rows: Union[List[dict], pd.DataFrame],
+                           returning: bool = True) -> List[dict]:
+        """Multi-row insert, chunked to stay under the PostgREST payload limit.
+
+        With ``returning=False`` Supabase does not echo the rows back and an
+        empty list is returned.
+        """
+        prefer = "return=representation" if returning else "return=minimal"
+        
+        async def insert_chunk(chunk: Union[List[dict], pd.DataFrame]) -> List[dict]:
+            # ``columns`` lets rows with differing key sets share one
+            # request; keys a row lacks are inserted as NULL
+            return await self._rest(
+                "POST", table, json=_rows_json(chunk),
+                params={"columns": _column_names(chunk)}, prefer=prefer,
+            )
+        
+        try:
+            return await self._send_chunks(rows, insert_chunk)
+        except Exception as e:
+            logger.error(f"Failed to bulk insert {len(rows)} rows into {table}: {e}")
+            raise
+    
+    async def _send_chunks(self, rows: Union[List[dict], pd.DataFrame],
+                           send_chunk: Callable[[Union[List[dict], pd.DataFrame]], Awaitable[List[dict]]]
+                           ) -> List[dict]:
+        """Send every chunk of ``rows``, up to BULK_MAX_CONCURRENCY at a
+        time, and return the affected rows in input order"""
+        # The workers share one chunk iterator, so each chunk is serialised
+        # only when a worker picks it up
+        chunks = enumerate(_chunked(rows))
+        results: Dict[int, List[dict]] = {}
+        failed = False
+        
+        async def worker():
+            nonlocal failed
+            for index, chunk in chunks:
+                if failed:
+                    return
+                try:
+                    results[index] = await send_chunk(chunk)
+                except Exception:
+                    # Stop the other workers from sending further chunks
+                    failed = True
+                    raise
+        
+        # Wait for the in-flight chunks of every worker before re-raising,
+        # so no worker is left running or with an unretrieved exception
+        outcomes = await asyncio.gather(*(worker() for _ in range(BULK_MAX_CONCURRENCY)),
+                                        return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        return [row for index in sorted(results) for row in results[index]]
+    
+    async def update_invoice_status(self, invoice_id: str, status: str, parsed_data: dict = None):
         """Update invoice parsing status and data"""
         try:
             update_data = {"status": status}
             if parsed_data:
                 update_data.update(parsed_data)
             
-            response = self.supabase.table("invoices").update(update_data).eq("id", invoice_id).execute()
-            return response.data[0] if response.data else None
+            data = await self._rest("PATCH", "invoices", json=update_data, params={"id": f"eq.{invoice_id}"})
+            return data[0] if data else None
         except Exception as e:
             logger.error(f"Failed to update invoice {invoice_id}: {e}")
             raise
     
-    def update_bank_statement_status(self, statement_id: str, status: str, parsed_data: dict = None):
+    async def update_bank_statement_status(self, statement_id: str, status: str, parsed_data: dict = None):
         """Update bank statement parsing status and data"""
         try:
             update_data = {"status": status}
             if parsed_data:
                 update_data.update(parsed_data)
             
-            response = self.supabase.table("bank_statements").update(update_data).eq("id", statement_id).execute()
-            return response.data[0] if response.data else None
+            data = await self._rest("PATCH", "bank_statements", json=update_data, params={"id": f"eq.{statement_id}"})
+            return data[0] if data else None
         except Exception as e:
             logger.error(f"Failed to update bank statement {statement_id}: {e}")
             raise
+    
+    async def commit_bank_statement(self, statement_id: str, rows: Union[List[dict], pd.DataFrame],
+                                    raw_text: str = None):
+        """Store a statement's transactions and mark it parsed.
+
+        The last chunk of rows travels with the status update in one
+        ``commit_bank_statement`` RPC, so a statement that fits in one
+        chunk is committed atomically in a single request.
+        """
+        split = (len(rows) - 1) // BULK_CHUNK_SIZE * BULK_CHUNK_SIZE if len(rows) else 0
+        try:
+            if split:
+                head = rows.iloc[:split] if isinstance(rows, pd.DataFrame) else rows[:split]
+                await self._insert_rows("bank_statements", head, returning=False)
+            last = rows.iloc[split:] if isinstance(rows, pd.DataFrame) else rows[split:]
+            # Serialised like every other bulk write
+            await self.rpc("commit_bank_statement", {
+                "p_file_id": statement_id,
+                "p_rows": _rows_json(last),
+                "p_raw_text": raw_text,
+            })
+        except Exception as e:
+            logger.error(f"Failed to commit bank statement {statement_id}: {e}")
+            raise
 
 # Global database instance
-db = DatabaseManager() 
\ No newline at end of file
+db = DatabaseManager()
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+def _init_worker_logging(level: int):
+    """Give a pool worker a plain console handler of its own.
+
+    A forked worker inherits the parent's QueueHandler but not the
+    listener thread draining its queue, so records logged there would
+    pile up in memory and never be written.
+    """
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        force=True
+    )
+
+class ParserPool:
+    """Process pool that keeps CPU-bound parsing off the event loop"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        """Spawn the worker processes; called on application startup"""
+        try:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker_logging,
+                initargs=(logging.getLogger().level,)
+            )
+            logger.info(f"Started parser pool with {self.max_workers} workers")
+        except Exception as e:
+            logger.error(f"Failed to start parser pool: {e}")
+            raise
+
+    def shutdown(self):
+        """Stop the worker processes; called on application shutdown"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a picklable module-level function in a worker process"""
+        if self.executor is None:
+            # Pool not started (e.g. scripts importing the routers directly),
+            # so at least move the work onto a thread
+            return await asyncio.to_thread(func, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+# Global parser pool instance
+parser_pool = ParserPool(max_workers=settings.parser_workers)
@@ -0,0 +1,47 @@
+import logging
+from typing import Any, Callable, Optional
+from arq import create_pool
+from arq.connections import ArqRedis, RedisSettings
+from fastapi import BackgroundTasks
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class ParseQueue:
+    """Hands parsing jobs to the arq workers (see ``app.worker``), or runs
+    them as in-process background tasks when no Redis URL is configured"""
+
+    def __init__(self, redis_url: str = ""):
+        self.redis_url = redis_url
+        self.redis: Optional[ArqRedis] = None
+
+    async def start(self):
+        """Connect to Redis; called on application startup"""
+        if not self.redis_url:
+            logger.info("No Redis URL configured, parsing runs in-process")
+            return
+        try:
+            self.redis = await create_pool(RedisSettings.from_dsn(self.redis_url))
+            logger.info("Connected to the parse queue")
+        except Exception as e:
+            logger.error(f"Failed to connect to the parse queue: {e}")
+            raise
+
+    async def close(self):
+        """Close the Redis connection; called on application shutdown"""
+        if self.redis is not None:
+            await self.redis.close()
+            self.redis = None
+
+    async def enqueue(self, background_tasks: BackgroundTasks, job: str,
+                      func: Callable[..., Any], file_id: str, **kwargs: Any):
+        """Queue ``job`` for a worker, falling back to running ``func`` after the response"""
+        if self.redis is None:
+            background_tasks.add_task(func, file_id=file_id, **kwargs)
+            return
+        # The file id doubles as the job id, so a retried upload request
+        # cannot queue the same file twice
+        await self.redis.enqueue_job(job, _job_id=file_id, file_id=file_id, **kwargs)
+
+# Global parse queue instance
+parse_queue = ParseQueue(redis_url=settings.redis_url)
@@ -1,43 +1,106 @@
 import logging
 import time
 from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 logger = logging.getLogger(__name__)
 
+# Only bodies smaller than this are read and logged
+MAX_LOGGED_BODY_BYTES = 1000
+
+# Room for the multipart boundaries and part headers around an uploaded file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+def _make_replay(body: bytes, receive: Receive) -> Receive:
+    """Build a receive callable that hands an already-read body to the
+    downstream app, then defers to the original channel"""
+    replayed = False
+
+    async def replay() -> Message:
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
+
 class DebugMiddleware(BaseHTTPMiddleware):
     """Middleware to log all requests and responses for debugging"""
     
     async def dispatch(self, request: Request, call_next):
         # Log request details
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
+        debug = logger.isEnabledFor(logging.DEBUG)
         
-        # Get request body for debugging (only for non-GET requests)
-        body = None
-        if request.method != "GET":
+        # Get request body for debugging (only for small non-GET requests
+        # while DEBUG logging is on; uploads are never buffered here)
+        if debug and request.method != "GET":
             try:
-                body = await request.body()
-                # Log body (be careful with sensitive data)
-                if len(body) < 1000:  # Only log small bodies
-                    logger.debug(f"Request body: {body.decode()}")
-            except Exception as e:
-                logger.debug(f"Could not read request body: {e}")
+                content_length = int(request.headers.get("content-length", "0"))
+            except ValueError:
+                content_length = MAX_LOGGED_BODY_BYTES
+            if content_length < MAX_LOGGED_BODY_BYTES:
+                try:
+                    body = await request.body()
+                    # Re-inject the body so the endpoint does not read the
+                    # network stream a second time
+                    request._receive = _make_replay(body, request.receive)
+                    # Log body (be careful with sensitive data)
+                    logger.debug(f"Request body: {body.decode(errors='replace')}")
+                except Exception as e:
+                    logger.debug(f"Could not read request body: {e}")
         
         logger.info(f"🔍 REQUEST: {request.method} {request.url}")
-        logger.debug(f"Headers: {dict(request.headers)}")
-        logger.debug(f"Query params: {dict(request.query_params)}")
+        if debug:
+            logger.debug(f"Headers: {dict(request.headers)}")
+            logger.debug(f"Query params: {dict(request.query_params)}")
         
         # Process request
         response = await call_next(request)
         
-        # Calculate processing time
-        process_time = time.time() - start_time
+        # Calculate processing time on the monotonic clock; it is only
+        # converted to seconds for output
+        elapsed_ns = time.perf_counter_ns() - start_ns
+        process_time = f"{elapsed_ns / 1e9:.3f}"
         
         # Log response details
-        logger.info(f"📤 RESPONSE: {response.status_code} - {process_time:.3f}s")
-        logger.debug(f"Response headers: {dict(response.headers)}")
+        logger.info(f"📤 RESPONSE: {response.status_code} - {process_time}s")
+        if debug:
+            logger.debug(f"Response headers: {dict(response.headers)}")
         
         # Add custom header for debugging
-        response.headers["X-Process-Time"] = str(process_time)
+        response.headers["X-Process-Time"] = process_time
         
-        return response 
\ No newline at end of file
+        return response
+
+class UploadSizeLimitMiddleware:
+    """Reject requests whose declared Content-Length is over the upload limit
+    with 413, before any of the body is received or parsed.
+
+    Requests without a Content-Length (chunked uploads) pass through; the
+    upload handler still checks the size of the file it receives.
+    """
+    
+    def __init__(self, app: ASGIApp, max_file_size: int):
+        self.app = app
+        # The body may exceed the file limit by the multipart framing, but
+        # clients are told the limit on the file itself
+        self.max_body_size = max_file_size + MULTIPART_OVERHEAD_BYTES
+        self.detail = f"File size exceeds maximum allowed size of {max_file_size} bytes"
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_body_size:
+                        response = ORJSONResponse(
+                            {"detail": self.detail},
+                            status_code=413,
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List
 from datetime import date, datetime
 from enum import Enum
@@ -10,6 +10,8 @@ class ParsingStatus(str, Enum):
     PROCESSING = "Processing"
 
 class InvoiceBase(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     invoice_number: Optional[str] = None
     invoice_date: Optional[date] = None
     vendor_name: Optional[str] = None
@@ -34,6 +36,8 @@ class InvoiceResponse(InvoiceBase):
     updated_at: datetime
 
 class BankStatementBase(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     txn_date: Optional[date] = None
     description: Optional[str] = None
     debit: Optional[float] = None
@@ -57,6 +61,8 @@ class BankStatementResponse(BankStatementBase):
     updated_at: datetime
 
 class UploadResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     message: str
     file_id: str
     file_path: str
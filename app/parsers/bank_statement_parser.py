@@ -1,20 +1,110 @@
-from io import StringIO
+import io
 import logging
 import re
 import pandas as pd
-from datetime import datetime
-from typing import Dict, Any, Optional, List
-from langchain_google_genai import ChatGoogleGenerativeAI
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from typing import Dict, Any, Optional, List, BinaryIO, Iterator, Tuple, Union
 from langchain.prompts import ChatPromptTemplate
 from langchain.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
-from app.parsers.base_parser import BaseParser
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from app.parsers.base_parser import BaseParser, clean_amount, clean_text, get_llm
 from app.config import settings
 import csv  # Added for delimiter detection
 
 logger = logging.getLogger(__name__)
 
+# Rows handed to the cleaning pipeline per pandas chunk
+CSV_CHUNK_SIZE = 10_000
+
+# Bytes of CSV parsed per Arrow record batch
+_ARROW_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Concurrent Gemini requests when parsing the pages of one statement;
+# keep within the API key's per-minute quota
+LLM_MAX_CONCURRENCY = 8
+
+# Documents packed into one batched Gemini prompt, and the character budget
+# that keeps a batch well inside the model's context window
+LLM_BATCH_SIZE = 10
+LLM_BATCH_MAX_CHARS = 60_000
+
+# How far into a CSV export to look for the transaction table header
+_HEADER_SCAN_LINES = 200
+
+# Candidate CSV delimiters, in order of preference on a tie
+_DELIMITERS = ",\t;|"
+
+# Bytes of the table given to csv.Sniffer when the header is inconclusive
+_SNIFF_SAMPLE_BYTES = 64 * 1024
+
+# ----------------------------------------------------------------------
+# Regex patterns are compiled once at import time instead of on every
+# call of the parsing helpers below.
+# ----------------------------------------------------------------------
+_ISO_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+_LEADING_DIGITS_RE = re.compile(r'\d+')
+
+# Payment mode keywords, shared by the fallback scanner and the check on
+# modes returned by the LLM; extending this tuple extends both
+_PAYMENT_MODES = ("UPI", "NEFT", "IMPS", "RTGS", "CASH", "CHEQUE", "CARD")
+_VALID_MODES = frozenset(_PAYMENT_MODES)
+
+# Fallback scanner: every field pattern fused into one alternation so the
+# raw text is scanned once.  Each match is dispatched on ``lastgroup``.
+# Quantifiers are possessive so a label followed by a long run of
+# whitespace or digits fails in linear time instead of backtracking
+# through every split of the run, and bare account numbers must not be
+# part of a longer digit run.  The description runs to the end of its
+# line or to the next labelled field, and is at most 200 characters so
+# each label costs bounded work; it is captured inside a lookahead, so
+# amounts and modes within it are still matched.
+_FALLBACK_RE = re.compile(r"""
+      (?=\b(?:description|narration|particulars|remarks)[ \t]*+:[ \t]*+(?P<description>[^\n]{0,200}?)
+          (?=\s++(?:date|debit|withdrawal|credit|deposit|balance|acc(?:ount)?|amount)\b[ \t]*+(?::|[₹$]?+[ \t]*+\d)
+            |\s*+$))
+    | (?:debit|withdrawal)\s*+:?+\s*+[₹$]?+\s*+(?P<debit>[\d,]++\.?+\d*+)
+    | (?:credit|deposit)\s*+:?+\s*+[₹$]?+\s*+(?P<credit>[\d,]++\.?+\d*+)
+    | balance\s*+:?+\s*+[₹$]?+\s*+(?P<balance>[\d,]++\.?+\d*+)
+    | acc(?:ount)?\s*+\#?+\s*+:?+\s*+(?P<account>\d++)
+    | (?P<date>\d{4}-\d{2}-\d{2}|\d{1,2}[/-]\d{1,2}[/-]\d{2,4})
+    | (?<!\d)(?P<generic_account>\d{10,16})(?!\d)
+    | (?P<mode>%s)
+""" % "|".join(map(re.escape, sorted(_PAYMENT_MODES, key=len, reverse=True))),
+    re.IGNORECASE | re.VERBOSE | re.MULTILINE)
+
+def _skip_invalid_row(row) -> str:
+    """Arrow invalid row handler mirroring pandas' on_bad_lines='skip'"""
+    return "skip"
+
+# Keywords that should all be present in the header row (matched
+# case-insensitively, so they are stored lowercased)
+_HEADER_KEYWORDS = tuple(keyword.lower() for keyword in (
+    "Date",
+    "Narration",
+    "Withdrawal",   # part of "Withdrawal Amt." column
+    "Deposit",      # part of "Deposit Amt." column
+    "Closing Balance",
+))
+
+# Common column mappings, upper-cased once: field -> accepted header names
+_COL_MAP = {
+    'date': frozenset(('DATE', 'TRANSACTION DATE', 'TXN DATE')),
+    'description': frozenset(('DESCRIPTION', 'NARRATION', 'PARTICULARS')),
+    'refId': frozenset(('CHQ./REF.NO.',)),
+    'debit': frozenset(('DEBIT', 'WITHDRAWAL', 'DR', 'WITHDRAWAL AMT.')),
+    'credit': frozenset(('CREDIT', 'DEPOSIT', 'CR', 'DEPOSIT AMT.')),
+    'balance': frozenset(('BALANCE', 'CLOSING BALANCE')),
+    'account': frozenset(('ACCOUNT', 'ACCOUNT NUMBER', 'ACC NO'))
+}
+
+# Reverse lookup so each table column costs one dict probe
+_COLUMN_FIELDS = {name: field for field, names in _COL_MAP.items() for name in names}
+
 class TransactionData(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     txn_date: Optional[str] = Field(None, description="Transaction date in YYYY-MM-DD format")
     description: Optional[str] = Field(None, description="Transaction description")
     debit: Optional[float] = Field(None, description="Debit amount")
@@ -24,428 +114,575 @@ class TransactionData(BaseModel):
     mode: Optional[str] = Field(None, description="Mode of payment (UPI, NEFT, IMPS, etc.)")
     category: Optional[str] = Field(None, description="Transaction category")
     meta_data: Optional[dict] = Field(None, description="Additional metadata like sender/receiver info")
+    
+    # The LLM output is cleaned while it is validated, so a response never
+    # needs a second pass; values that fail a check are dropped, not errors
+    @field_validator("txn_date", mode="before")
+    @classmethod
+    def check_date(cls, value: Any) -> Optional[str]:
+        text = clean_text(value)
+        return text if text and _ISO_DATE_RE.match(text) else None
+    
+    @field_validator("description", "category", mode="before")
+    @classmethod
+    def strip_text(cls, value: Any) -> Optional[str]:
+        return clean_text(value)
+    
+    @field_validator("debit", "credit", "balance", mode="before")
+    @classmethod
+    def parse_amount(cls, value: Any) -> Optional[float]:
+        return clean_amount(value)
+    
+    @field_validator("account_number", mode="before")
+    @classmethod
+    def check_account_number(cls, value: Any) -> Optional[str]:
+        # Remove common prefixes; 8 digits is the minimum account number length
+        digits = _NON_DIGIT_RE.sub('', str(value)) if value else ''
+        return digits if len(digits) >= 8 else None
+    
+    @field_validator("mode", mode="before")
+    @classmethod
+    def check_mode(cls, value: Any) -> Optional[str]:
+        mode = (clean_text(value) or '').upper()
+        return mode if mode in _VALID_MODES else None
+    
+    @field_validator("meta_data", mode="before")
+    @classmethod
+    def check_meta_data(cls, value: Any) -> Optional[dict]:
+        return value if value and isinstance(value, dict) else None
+
+class TransactionBatch(BaseModel):
+    """Wrapper letting one Gemini response carry several documents"""
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
+    documents: List[TransactionData] = Field(default_factory=list, description="One entry per document, in input order")
+
+# Output parsers shared by every instance; they hold no per-call state
+_OUT_PARSER = PydanticOutputParser(pydantic_object=TransactionData)
+_BATCH_OUT_PARSER = PydanticOutputParser(pydantic_object=TransactionBatch)
+# The schemas never change, so their JSON instructions are rendered once
+_FORMAT_INSTRUCTIONS = _OUT_PARSER.get_format_instructions()
+_BATCH_FORMAT_INSTRUCTIONS = _BATCH_OUT_PARSER.get_format_instructions()
+
+# Field extraction instructions shared by the single and batched prompts
+_SYSTEM_PROMPT = """You are an expert at extracting bank statement information from text.
+Extract the following fields from the provided bank statement text:
+- Transaction date (convert to YYYY-MM-DD format)
+- Description (vendor, UPI, NEFT, etc.)
+- Debit amount (if money is going out)
+- Credit amount (if money is coming in)
+- Closing balance
+- Bank account number
+- Mode of payment (UPI, IMPS, NEFT, etc.)
+- Transaction category
+- Meta data (user account info, sender/receiver info)
+
+If a field is not found, return null for that field.
+For amounts, extract only the numeric value without currency symbols.
+For dates, ensure they are in YYYY-MM-DD format.
+For mode, identify common payment methods like UPI, NEFT, IMPS, RTGS, etc."""
 
 class BankStatementParser(BaseParser):
     def __init__(self):
         super().__init__()
-        self.llm = ChatGoogleGenerativeAI(
-            google_api_key=settings.google_api_key,
-            model="gemini-pro",
-            temperature=0,
-            convert_system_message_to_human=True
-        )
-        self.parser = PydanticOutputParser(pydantic_object=TransactionData)
+        self.llm = get_llm()
+        self.parser = _OUT_PARSER
+        # The prompt and chain are built once and reused for every call
+        self._chain = self._build_prompt() | self.llm | self.parser
+        self._batch_chain = self._build_batch_prompt() | self.llm | _BATCH_OUT_PARSER
+    
+    def _build_prompt(self) -> ChatPromptTemplate:
+        """Create prompt for bank statement parsing"""
+        return ChatPromptTemplate.from_messages([
+            ("system", _SYSTEM_PROMPT + "\n\n{format_instructions}"),
+            ("user", "Please extract bank statement information from this text:\n\n{text}{hint}")
+        ]).partial(format_instructions=_FORMAT_INSTRUCTIONS, hint="")
+    
+    def _build_batch_prompt(self) -> ChatPromptTemplate:
+        """Create prompt for parsing several numbered documents in one call"""
+        return ChatPromptTemplate.from_messages([
+            ("system", _SYSTEM_PROMPT + """
+
+You will receive several numbered documents. Return exactly one entry per
+document, in the same order as the input.
+{format_instructions}"""),
+            ("user", "Please extract bank statement information from each of these documents:\n\n{documents}")
+        ]).partial(format_instructions=_BATCH_FORMAT_INSTRUCTIONS)
     
     def _parse_content(self, raw_text: str) -> Dict[str, Any]:
         """Parse bank statement content using Google Gemini"""
-        try:
-            # Create prompt for bank statement parsing
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", """You are an expert at extracting bank statement information from text. 
-                Extract the following fields from the provided bank statement text:
-                - Transaction date (convert to YYYY-MM-DD format)
-                - Description (vendor, UPI, NEFT, etc.)
-                - Debit amount (if money is going out)
-                - Credit amount (if money is coming in)
-                - Closing balance
-                - Bank account number
-                - Mode of payment (UPI, IMPS, NEFT, etc.)
-                - Transaction category
-                - Meta data (user account info, sender/receiver info)
-                
-                If a field is not found, return null for that field.
-                For amounts, extract only the numeric value without currency symbols.
-                For dates, ensure they are in YYYY-MM-DD format.
-                For mode, identify common payment methods like UPI, NEFT, IMPS, RTGS, etc."""),
-                ("user", "Please extract bank statement information from this text:\n\n{text}")
-            ])
-            
+        cache_key = self._llm_cache_key(raw_text)
+        cached = self._get_cached_result(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Well-formatted text is fully handled by the regex parser, so the
+        # LLM is only consulted for what it could not find
+        known = self._fallback_parse(raw_text)
+        if self._is_complete(known):
+            self._cache_result(cache_key, known)
+            return known
+        
+        def ask_llm() -> Dict[str, Any]:
             # Get response from Gemini
-            chain = prompt | self.llm | self.parser
-            result = chain.invoke({"text": raw_text})
-            
-            # Convert to dictionary
-            parsed_data = result.dict()
-            
-            # Clean and validate data
-            parsed_data = self._clean_statement_data(parsed_data)
+            result = self._chain.invoke({"text": raw_text, "hint": self._format_hint(known)})
             
+            # The model's validators already cleaned every field; regex
+            # values fill whatever it left out
+            parsed_data = {**known, **result.model_dump(exclude_none=True)}
+            self._cache_result(cache_key, parsed_data)
             return parsed_data
+        
+        try:
+            # Identical documents parsed concurrently share one Gemini call
+            return self._collapse_llm_call(cache_key, ask_llm)
             
         except Exception as e:
             logger.error(f"Error parsing bank statement content: {e}")
             # Fallback to basic regex extraction
-            return self._fallback_parse(raw_text)
+            return known
+    
+    def _is_complete(self, data: Dict[str, Any]) -> bool:
+        """Whether a regex parse already holds every field a transaction needs.
+
+        Only category and meta_data, which the LLM infers instead of
+        reading from the text, are then left unset.
+        """
+        return bool(
+            data.get("txn_date") and data.get("description")
+            and (data.get("debit") or data.get("credit")) and data.get("balance")
+        )
     
-    def _clean_statement_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Clean and validate extracted bank statement data"""
-        cleaned_data = {}
+    def parse_pages(self, pages: List[str]) -> List[Dict[str, Any]]:
+        """Parse the pages of a statement with concurrent Gemini calls"""
+        # Pages seen before are answered from the cache; only the rest are
+        # sent to Gemini
+        cache_keys = [self._llm_cache_key(page) for page in pages]
+        parsed_pages: List[Optional[Dict[str, Any]]] = [self._get_cached_result(key) for key in cache_keys]
+        misses = [i for i, parsed in enumerate(parsed_pages) if parsed is None]
         
-        # Clean and validate date
-        if data.get("txn_date"):
-            try:
-                date_str = str(data["txn_date"]).strip()
-                if re.match(r'\d{4}-\d{2}-\d{2}', date_str):
-                    cleaned_data["txn_date"] = date_str
-            except:
-                pass
+        results = self._chain.batch(
+            [{"text": pages[i]} for i in misses],
+            config={"max_concurrency": LLM_MAX_CONCURRENCY},
+            return_exceptions=True
+        ) if misses else []
         
-        # Clean description
-        if data.get("description"):
-            cleaned_data["description"] = str(data["description"]).strip()
+        for i, result in zip(misses, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error parsing bank statement page: {result}")
+                parsed_pages[i] = self._fallback_parse(pages[i])
+            else:
+                parsed_pages[i] = result.model_dump(exclude_none=True)
+                self._cache_result(cache_keys[i], parsed_pages[i])
+        return parsed_pages
+    
+    def parse_batch(self, raw_texts: List[str]) -> List[Dict[str, Any]]:
+        """Parse several documents with as few Gemini calls as possible.
+
+        Uncached documents are packed into numbered prompts of at most
+        ``LLM_BATCH_SIZE`` documents and ``LLM_BATCH_MAX_CHARS`` characters,
+        and the prompts are sent concurrently.  A batch whose response
+        cannot be matched back to its documents is re-parsed page by page.
+        """
+        cache_keys = [self._llm_cache_key(text) for text in raw_texts]
+        parsed_docs: List[Optional[Dict[str, Any]]] = [self._get_cached_result(key) for key in cache_keys]
         
-        # Clean numeric values
-        for field in ["debit", "credit", "balance"]:
-            if data.get(field):
-                try:
-                    value = float(str(data[field]).replace(',', ''))
-                    cleaned_data[field] = value
-                except:
-                    pass
+        groups: List[List[int]] = []
+        group: List[int] = []
+        group_chars = 0
+        for i, parsed in enumerate(parsed_docs):
+            if parsed is not None:
+                continue
+            if group and (len(group) >= LLM_BATCH_SIZE or group_chars + len(raw_texts[i]) > LLM_BATCH_MAX_CHARS):
+                groups.append(group)
+                group, group_chars = [], 0
+            group.append(i)
+            group_chars += len(raw_texts[i])
+        if group:
+            groups.append(group)
+        if not groups:
+            return parsed_docs
         
-        # Clean account number
-        if data.get("account_number"):
-            account_num = str(data["account_number"]).strip()
-            # Remove common prefixes and clean
-            account_num = re.sub(r'[^\d]', '', account_num)
-            if len(account_num) >= 8:  # Minimum account number length
-                cleaned_data["account_number"] = account_num
+        results = self._batch_chain.batch(
+            [{"documents": "\n".join(f"[{n}]\n{raw_texts[i]}" for n, i in enumerate(group, 1))} for group in groups],
+            config={"max_concurrency": LLM_MAX_CONCURRENCY},
+            return_exceptions=True
+        )
         
-        # Clean mode of payment
-        if data.get("mode"):
-            mode = str(data["mode"]).strip().upper()
-            valid_modes = ["UPI", "NEFT", "IMPS", "RTGS", "CASH", "CHEQUE", "CARD"]
-            if mode in valid_modes:
-                cleaned_data["mode"] = mode
+        for group, result in zip(groups, results):
+            if isinstance(result, Exception) or len(result.documents) != len(group):
+                error = result if isinstance(result, Exception) else f"got {len(result.documents)} results"
+                logger.error(f"Error parsing batch of {len(group)} bank statement documents: {error}")
+                for i, parsed in zip(group, self.parse_pages([raw_texts[i] for i in group])):
+                    parsed_docs[i] = parsed
+                continue
+            for i, document in zip(group, result.documents):
+                parsed_docs[i] = document.model_dump(exclude_none=True)
+                self._cache_result(cache_keys[i], parsed_docs[i])
+        return parsed_docs
+    
+    def parse_pdf_statement(self, file_content: bytes) -> Dict[str, Any]:
+        """Parse a PDF statement.  Statements exported as a ruled table are
+        read straight from that table; otherwise a single page goes through
+        ``_parse_content`` and the pages of a longer statement are parsed
+        together by ``parse_batch``, one transaction per page."""
+        sheet = self._try_extract_tables(file_content)
+        if sheet is not None:
+            transactions = self._collect_transactions(iter([self._table_from_sheet(sheet)]))
+            if not transactions.empty:
+                return {
+                    "raw_text": None,
+                    "parsed_data": {},
+                    "transactions": transactions,
+                    "file_type": ".pdf"
+                }
         
-        # Clean category
-        if data.get("category"):
-            cleaned_data["category"] = str(data["category"]).strip()
+        pages = list(self._extract_pdf_pages(file_content))
+        raw_text = "\n".join(pages)
         
-        # Clean meta data
-        if data.get("meta_data") and isinstance(data["meta_data"], dict):
-            cleaned_data["meta_data"] = data["meta_data"]
+        parsed_data: Dict[str, Any] = {}
+        transactions: List[Dict[str, Any]] = []
+        if len(pages) > 1:
+            transactions = [txn for txn in self.parse_batch(pages) if txn]
+        else:
+            parsed_data = self._parse_content(raw_text)
         
-        return cleaned_data
+        return {
+            "raw_text": raw_text,
+            "parsed_data": parsed_data,
+            "transactions": transactions,
+            "file_type": ".pdf"
+        }
     
     def _fallback_parse(self, raw_text: str) -> Dict[str, Any]:
         """Fallback parsing using regex patterns"""
         data = {}
+        date_str = labelled_account = generic_account = None
         
-        # Extract date patterns
-        date_patterns = [
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'(\d{4}-\d{2}-\d{2})',
-            r'(\d{2}-\d{2}-\d{4})'
-        ]
-        
-        for pattern in date_patterns:
-            match = re.search(pattern, raw_text)
-            if match:
-                try:
-                    date_str = match.group(1)
-                    # Try to parse and format date
-                    if '/' in date_str:
-                        parts = date_str.split('/')
-                        if len(parts) == 3:
-                            if len(parts[2]) == 2:
-                                parts[2] = '20' + parts[2]
-                            data["txn_date"] = f"{parts[2]}-{parts[1].zfill(2)}-{parts[0].zfill(2)}"
-                    elif '-' in date_str:
-                        data["txn_date"] = date_str
-                    break
-                except:
-                    continue
-        
-        # Extract amounts
-        amount_patterns = [
-            r'debit\s*:?\s*[₹$]?\s*([\d,]+\.?\d*)',
-            r'withdrawal\s*:?\s*[₹$]?\s*([\d,]+\.?\d*)',
-            r'credit\s*:?\s*[₹$]?\s*([\d,]+\.?\d*)',
-            r'deposit\s*:?\s*[₹$]?\s*([\d,]+\.?\d*)',
-            r'balance\s*:?\s*[₹$]?\s*([\d,]+\.?\d*)'
-        ]
-        
-        for pattern in amount_patterns:
-            match = re.search(pattern, raw_text, re.IGNORECASE)
-            if match:
-                try:
-                    amount = float(match.group(1).replace(',', ''))
-                    if 'debit' in pattern.lower() or 'withdrawal' in pattern.lower():
-                        data["debit"] = amount
-                    elif 'credit' in pattern.lower() or 'deposit' in pattern.lower():
-                        data["credit"] = amount
-                    elif 'balance' in pattern.lower():
-                        data["balance"] = amount
-                except:
-                    continue
-        
-        # Extract account number
-        account_patterns = [
-            r'account\s*#?\s*:?\s*(\d+)',
-            r'acc\s*#?\s*:?\s*(\d+)',
-            r'(\d{10,16})'  # Generic account number pattern
-        ]
-        
-        for pattern in account_patterns:
-            match = re.search(pattern, raw_text, re.IGNORECASE)
-            if match:
-                account_num = match.group(1)
-                if len(account_num) >= 8:
-                    data["account_number"] = account_num
-                break
+        # Single pass over the text; only the first hit per field is kept
+        for match in _FALLBACK_RE.finditer(raw_text):
+            kind = match.lastgroup
+            value = match.group(kind)
+            
+            if kind == "date":
+                if date_str is None:
+                    date_str = value
+            elif kind in ("debit", "credit", "balance"):
+                if kind not in data:
+                    try:
+                        data[kind] = float(value.replace(',', ''))
+                    except ValueError:
+                        continue
+            elif kind == "account":
+                if labelled_account is None:
+                    labelled_account = value
+            elif kind == "generic_account":
+                if generic_account is None:
+                    generic_account = value
+            elif kind == "mode":
+                data.setdefault("mode", value.upper())
+            elif kind == "description":
+                if "description" not in data and (text := clean_text(value)):
+                    data["description"] = text
         
-        # Extract payment mode
-        mode_patterns = [
-            r'(UPI|NEFT|IMPS|RTGS|CASH|CHEQUE|CARD)',
-            r'payment\s*mode\s*:?\s*(UPI|NEFT|IMPS|RTGS|CASH|CHEQUE|CARD)'
-        ]
+        # Format the date
+        if date_str:
+            if '/' in date_str:
+                parts = date_str.split('/')
+                if len(parts) == 3:
+                    if len(parts[2]) == 2:
+                        parts[2] = '20' + parts[2]
+                    data["txn_date"] = f"{parts[2]}-{parts[1].zfill(2)}-{parts[0].zfill(2)}"
+            elif '-' in date_str:
+                data["txn_date"] = date_str
         
-        for pattern in mode_patterns:
-            match = re.search(pattern, raw_text, re.IGNORECASE)
-            if match:
-                data["mode"] = match.group(1).upper()
-                break
+        # A labelled account number takes precedence over a bare digit run
+        account_num = labelled_account if labelled_account is not None else generic_account
+        if account_num and len(account_num) >= 8:
+            data["account_number"] = account_num
         
         return data
     
-    def parse_csv_statement(self, file_content: bytes) -> List[Dict[str, Any]]:
-        """Specialized parsing for CSV bank statements"""
-        try:
-            # Convert bytes to StringIO for pandas compatibility
-            file_content_str = file_content.decode('utf-8')
-
-            # ------------------------------------------------------------------
-            # Some bank statement exports prepend unstructured metadata (account
-            # info, generation timestamps, disclaimers, etc.) before the actual
-            # transaction table.  We want to locate the first line that contains
-            # the expected table headers and remove everything that appears
-            # before it.  The cleaned CSV string (table_str) is what we give to
-            # pandas.
-            # ------------------------------------------------------------------
-
-            # Split the file into lines for inspection
-            lines: List[str] = file_content_str.splitlines()
-
-            # Keywords that should all be present in the header row (case-insensitive)
-            header_keywords = [
-                "Date",
-                "Narration",
-                "Withdrawal",   # part of "Withdrawal Amt." column
-                "Deposit",      # part of "Deposit Amt." column
-                "Closing Balance"
-            ]
-
-            header_index: Optional[int] = None
-            for idx, line in enumerate(lines):
-                lowered = line.lower()
-                if all(keyword.lower() in lowered for keyword in header_keywords):
-                    header_index = idx
-                    break
-
-            # Separate metadata and table
-            if header_index is not None:
-                _metadata_str = "\n".join(lines[:header_index])  # stored for potential future use
-                # -----------------------------------------------
-                # Extract structured information (account number,
-                # IFSC, email, etc.) from this metadata block so it
-                # can be consumed by the caller if desired.
-                # -----------------------------------------------
-                try:
-                    self.metadata_info = self._extract_metadata_info(_metadata_str)
-                except Exception as meta_err:
-                    logger.debug(f"Metadata extraction failed: {meta_err}")
-                table_str = "\n".join(lines[header_index:])
-            else:
-                # Fallback: assume the entire file is the table
-                _metadata_str = ""
-                table_str = file_content_str
-
-            # ---------------------------------------------------------------
-            # Detect the delimiter dynamically so that quoted commas do not
-            # break the parsing logic (e.g. descriptions that contain commas).
-            # We first try csv.Sniffer; if detection fails we fall back to
-            # common delimiters.  We also ensure that bad lines are skipped so
-            # that an occasional malformed row does not abort the entire parse
-            # routine.
-            # ---------------------------------------------------------------
+    def iter_csv_statement(self, file_obj: Union[bytes, BinaryIO]) -> Iterator[pd.DataFrame]:
+        """Specialized parsing for CSV bank statements.
 
-            detected_delim = ","  # sensible default
-            try:
-                # Use csv.Sniffer to guess the delimiter from a sample
-                potential = csv.Sniffer().sniff(table_str, delimiters=",\t;|")
-                detected_delim = potential.delimiter
-            except csv.Error:
-                # Use the header line (if identified) or the first line in the file
-                header_line = lines[header_index] if header_index is not None else lines[0]
-                if "\t" in header_line:
-                    detected_delim = "\t"
+        ``file_obj`` may be raw bytes or a seekable binary stream.  The
+        stream is scanned line by line for the table header and the table
+        itself is read in chunks; the cleaned transactions are yielded one
+        chunk at a time, so a caller can store each chunk before the rest
+        of the file has been parsed.
+
+        A file that cannot be read yields nothing, so the caller falls back
+        to general parsing.  Once a chunk has been yielded errors are
+        raised instead, and the fallback readers (pandas with the detected
+        delimiter, then with a regex separator) are no longer tried, since
+        they would read the table again from its first row.
+        """
+        emitted = False
+        try:
+            if isinstance(file_obj, (bytes, bytearray)):
+                file_obj = io.BytesIO(file_obj)
+            table_offset, detected_delim, header_line = self._locate_csv_table(file_obj)
 
             try:
-                df = pd.read_csv(
-                    StringIO(table_str),
-                    delimiter=detected_delim,
-                    engine="python",
-                    on_bad_lines="skip",  # pandas >= 1.3
-                )
+                for frame in self._clean_chunks(
+                    self._read_arrow_chunks(file_obj, table_offset, detected_delim, header_line)
+                ):
+                    emitted = True
+                    yield frame
             except Exception as e:
+                if emitted:
+                    raise
                 logger.error(
-                    f"Primary CSV read failed with delimiter '{detected_delim}': {e}. Falling back to regex separator."
-                )
-                # Fallback to regex separator that handles both comma and tab,
-                # but ignore quoting issues by skipping bad lines.
-                df = pd.read_csv(
-                    StringIO(table_str),
-                    sep=r",|\t",
-                    engine="python",
-                    on_bad_lines="skip",
-                )
-            transactions = []
-            
-            # Common column mappings
-            column_mappings = {
-                'date': ['Date', 'Transaction Date', 'Txn Date', 'DATE'],
-                'description': ['Description', 'Narration', 'Particulars', 'DESCRIPTION'],
-                'refId': ['Chq./Ref.No.'],
-                'debit': ['Debit', 'Withdrawal', 'DR', 'DEBIT', 'Withdrawal Amt.'],
-                'credit': ['Credit', 'Deposit', 'CR', 'CREDIT', 'Deposit Amt.'],
-                'balance': ['Balance', 'Closing Balance', 'BALANCE'],
-                'account': ['Account', 'Account Number', 'ACC NO', 'ACCOUNT']
-            }
-            
-            
-            # Map columns
-            mapped_columns = {}
-            for field, possible_names in column_mappings.items():
-                for col in df.columns:
-                    if col.upper() in [name.upper() for name in possible_names]:
-                        mapped_columns[field] = col
-                        break
-            
-            # Process each row
-            for _, row in df.iterrows():
-                transaction = {}
-                
-                # Extract date
-                if 'date' in mapped_columns:
-                    try:
-                        date_val = row[mapped_columns['date']]
-                        if pd.notna(date_val):
-                            if isinstance(date_val, str):
-                                # Try to parse date
-                                transaction['date'] = self._parse_date_string(date_val)
-                    except:
-                        pass
-                
-                # Extract description
-                if 'description' in mapped_columns:
-                    desc_val = row[mapped_columns['description']]
-                    if pd.notna(desc_val):
-                        transaction['description'] = str(desc_val).strip()
-                
-                # Extract amounts
-                if 'debit' in mapped_columns:
-                    debit_val = row[mapped_columns['debit']]
-                    if pd.notna(debit_val):
-                        try:
-                            transaction['debit'] = float(str(debit_val).replace(',', ''))
-                        except:
-                            pass
-                
-                if 'credit' in mapped_columns:
-                    credit_val = row[mapped_columns['credit']]
-                    if pd.notna(credit_val):
-                        try:
-                            transaction['credit'] = float(str(credit_val).replace(',', ''))
-                        except:
-                            pass
-                
-                if 'balance' in mapped_columns:
-                    balance_val = row[mapped_columns['balance']]
-                    if pd.notna(balance_val):
-                        try:
-                            transaction['balance'] = float(str(balance_val).replace(',', ''))
-                        except:
-                            pass
-                
-                # Extract account number
-                if 'account' in mapped_columns:
-                    acc_val = row[mapped_columns['account']]
-                    if pd.notna(acc_val):
-                        acc_str = str(acc_val).strip()
-                        if re.match(r'\d+', acc_str):
-                            transaction['account_number'] = acc_str
-                
-                # Add the row only if it has a valid date *and* at least one
-                # monetary value (debit or credit).  This prevents inclusion
-                # of header lines or rows that have no financial impact.
-                date_ok = transaction.get("date") is not None
-                amount_ok = (transaction.get("debit") is not None) or (
-                    transaction.get("credit") is not None
+                    f"Primary CSV read failed with delimiter '{detected_delim}': {e}. Retrying with pandas."
                 )
-                if date_ok and amount_ok:
-                    transactions.append(transaction)
-            
-            return transactions
-            
+                try:
+                    # pandas' python engine with the same delimiter copes with
+                    # what Arrow rejects, e.g. duplicate column names
+                    for frame in self._clean_chunks(
+                        self._read_pandas_chunks(file_obj, table_offset, sep=detected_delim)
+                    ):
+                        emitted = True
+                        yield frame
+                except Exception as e:
+                    if emitted:
+                        raise
+                    logger.error(
+                        f"Pandas CSV read failed with delimiter '{detected_delim}': {e}. Falling back to regex separator."
+                    )
+                    # Fallback to pandas' python engine with a regex separator that
+                    # handles both comma and tab, but ignore quoting issues by
+                    # skipping bad lines.
+                    for frame in self._clean_chunks(self._read_pandas_chunks(file_obj, table_offset, sep=r",|\t")):
+                        emitted = True
+                        yield frame
+
         except Exception as e:
+            if emitted:
+                raise
             logger.error(f"Error parsing CSV bank statement: {e}")
-            return []
     
-    def _parse_date_string(self, date_str: str) -> Optional[str]:
-        """Parse various date formats to YYYY-MM-DD"""
+    def _locate_csv_table(self, file_obj: BinaryIO) -> Tuple[int, str, str]:
+        """Find where the transaction table of a CSV stream starts.
+
+        Returns the table's byte offset, its delimiter and its header line.
+        Nothing is stored on the parser, which is shared between tasks.
+        """
+        start_offset = file_obj.tell()
+
+        # ------------------------------------------------------------------
+        # Some bank statement exports prepend unstructured metadata (account
+        # info, generation timestamps, disclaimers, etc.) before the actual
+        # transaction table.  We want to locate the first line that contains
+        # the expected table headers and skip everything that appears
+        # before it.  Only the byte offset of the header row is kept; the
+        # table is read from there straight out of the stream.
+        # ------------------------------------------------------------------
+        header_offset: Optional[int] = None
+        header_line = first_line = ""
+        for _ in range(_HEADER_SCAN_LINES):
+            line_offset = file_obj.tell()
+            raw_line = file_obj.readline()
+            if not raw_line:
+                break
+            line = raw_line.decode('utf-8')
+            lowered = line.lower()
+            if all(keyword in lowered for keyword in _HEADER_KEYWORDS):
+                header_offset = line_offset
+                header_line = line
+                break
+            first_line = first_line or line
+
+        # Skip the metadata above the table
+        if header_offset is not None:
+            table_offset = header_offset
+        else:
+            # Fallback: assume the entire file is the table
+            table_offset = start_offset
+            header_line = first_line
+
+        # ---------------------------------------------------------------
+        # Detect the delimiter dynamically so that quoted commas do not
+        # break the parsing logic (e.g. descriptions that contain commas).
+        # The header row has no free text, so the candidate that occurs
+        # most often in it is the delimiter.  csv.Sniffer on a sample of
+        # the table is only consulted when the header contains none of
+        # them.  We also ensure that bad lines are skipped so that an
+        # occasional malformed row does not abort the entire parse
+        # routine.
+        # ---------------------------------------------------------------
+        detected_delim = max(_DELIMITERS, key=header_line.count)
+        if not header_line.count(detected_delim):
+            detected_delim = ","  # sensible default
+            file_obj.seek(table_offset)
+            sample = file_obj.read(_SNIFF_SAMPLE_BYTES).decode('utf-8', errors='ignore')
+            try:
+                detected_delim = csv.Sniffer().sniff(sample, delimiters=_DELIMITERS).delimiter
+            except csv.Error:
+                pass
+
+        return table_offset, detected_delim, header_line
+    
+    def parse_excel_statement(self, file_obj: Union[bytes, BinaryIO]) -> Tuple[pd.DataFrame, Optional[str]]:
+        """Specialized parsing for Excel bank statements.
+
+        When the sheet holds no transactions its CSV text is returned as
+        well, so the text-based fallback need not read the workbook again;
+        the text is None when transactions were found or reading failed.
+        """
         try:
-            # Common date formats
-            formats = [
-                '%d/%m/%Y', '%d/%m/%y', '%d-%m-%Y', '%d-%m-%y',
-                '%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%m/%d/%y'
-            ]
-            
-            for fmt in formats:
-                try:
-                    parsed_date = datetime.strptime(date_str, fmt)
-                    return parsed_date.strftime('%Y-%m-%d')
-                except:
-                    continue
-            
-            return None
-        except:
-            return None
-
-    # ------------------------------------------------------------------
-    #                     METADATA EXTRACTION HELPERS
-    # ------------------------------------------------------------------
-    def _extract_metadata_info(self, meta_str: str) -> Dict[str, Any]:
-        """Pull key–value pairs from the unstructured header section."""
-        info: Dict[str, Any] = {}
-
-        # Account number
-        if (m := re.search(r"Account\s*No\s*:?\s*(\d+)", meta_str, re.IGNORECASE)):
-            info["account_number"] = m.group(1)
-
-        # IFSC code (standard 11-char pattern)
-        if (m := re.search(r"\b[A-Z]{4}0[A-Z0-9]{6}\b", meta_str)):
-            info["ifsc"] = m.group(0)
-
-        # Customer ID
-        if (m := re.search(r"Cust\s*ID\s*:?\s*(\d+)", meta_str, re.IGNORECASE)):
-            info["customer_id"] = m.group(1)
-
-        # Email
-        if (m := re.search(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}", meta_str)):
-            info["email"] = m.group(0)
-
-        # Statement date range
-        if (m := re.search(r"Statement\s+From\s*:?\s*([0-9/]{6,10})\s*To\s*:?\s*([0-9/]{6,10})", meta_str, re.IGNORECASE)):
-            info["statement_from"] = self._parse_date_string(m.group(1)) or m.group(1)
-            info["statement_to"] = self._parse_date_string(m.group(2)) or m.group(2)
-
-        # Address (first line after 'Address :')
-        if (m := re.search(r"Address\s*:?\s*([^,\n]+)", meta_str, re.IGNORECASE)):
-            info["address"] = m.group(1).strip()
-
-        # Joint holders
-        if (m := re.search(r"JOINT\s+HOLDERS\s*:?\s*([^,\n]+)", meta_str, re.IGNORECASE)):
-            info["joint_holders"] = m.group(1).strip()
-
-        return info 
\ No newline at end of file
+            if isinstance(file_obj, (bytes, bytearray)):
+                file_obj = io.BytesIO(file_obj)
+            sheet = pd.read_excel(file_obj, header=None, dtype=str)
+            transactions = self._collect_transactions(iter([self._table_from_sheet(sheet)]))
+            if not transactions.empty:
+                return transactions, None
+            # Same layout as _parse_excel: CSV text, far smaller than to_string()
+            return transactions, sheet.to_csv(index=False, header=False)
+
+        except Exception as e:
+            logger.error(f"Error parsing Excel bank statement: {e}")
+            return pd.DataFrame(), None
+    
+    def _table_from_sheet(self, sheet: pd.DataFrame) -> pd.DataFrame:
+        """Promote the header row of a headerless sheet to column names"""
+        # Locate the header row the same way as for CSV exports so any
+        # metadata rows above the table are skipped
+        header_row = 0
+        for idx, row in enumerate(sheet.itertuples(index=False)):
+            lowered = " ".join(str(val) for val in row if isinstance(val, str)).lower()
+            if all(keyword in lowered for keyword in _HEADER_KEYWORDS):
+                header_row = idx
+                break
+            if idx >= _HEADER_SCAN_LINES:
+                break
+
+        table = sheet.iloc[header_row + 1:]
+        table.columns = [str(col).strip() for col in sheet.iloc[header_row]]
+        return table
+    
+    def _collect_transactions(self, chunks: Iterator[pd.DataFrame]) -> pd.DataFrame:
+        """Run every table chunk through the cleaning pipeline"""
+        frames = list(self._clean_chunks(chunks))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+    
+    def _clean_chunks(self, chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """Clean each table chunk, skipping chunks without transactions"""
+        mapped_columns: Optional[Dict[str, str]] = None
+        for chunk in chunks:
+            if mapped_columns is None:
+                mapped_columns = self._map_columns(chunk.columns)
+            cleaned = self._clean_frame(chunk, mapped_columns)
+            if not cleaned.empty:
+                yield cleaned
+    
+    def _read_arrow_chunks(self, file_obj: BinaryIO, offset: int, delimiter: str,
+                           header_line: str) -> Iterator[pd.DataFrame]:
+        """Stream the table starting at ``offset`` through Arrow's
+        multi-threaded C++ CSV reader, one record batch at a time"""
+        # Every column is read as a string (like dtype=str for pandas) so
+        # that a later block cannot contradict the types inferred from the
+        # first one; the cleaning pipeline does its own conversions.
+        column_names = next(csv.reader([header_line.lstrip('\ufeff').rstrip('\r\n')], delimiter=delimiter))
+        file_obj.seek(offset)
+        reader = pacsv.open_csv(
+            file_obj,
+            read_options=pacsv.ReadOptions(block_size=_ARROW_BLOCK_SIZE),
+            parse_options=pacsv.ParseOptions(
+                delimiter=delimiter,
+                newlines_in_values=True,
+                invalid_row_handler=_skip_invalid_row,
+            ),
+            convert_options=pacsv.ConvertOptions(
+                column_types=dict.fromkeys(column_names, pa.string()),
+                strings_can_be_null=True,
+            ),
+        )
+        for batch in reader:
+            yield batch.to_pandas()
+    
+    def _read_pandas_chunks(self, file_obj: BinaryIO, offset: int, **read_options) -> Iterator[pd.DataFrame]:
+        """Read the table starting at ``offset`` with pandas' python engine"""
+        file_obj.seek(offset)
+        text_io = io.TextIOWrapper(file_obj, encoding='utf-8', newline='')
+        try:
+            yield from pd.read_csv(
+                text_io,
+                engine="python",
+                on_bad_lines="skip",  # pandas >= 1.3
+                dtype=str,
+                chunksize=CSV_CHUNK_SIZE,
+                **read_options,
+            )
+        finally:
+            # Hand the underlying stream back without closing it
+            text_io.detach()
+    
+    def _map_columns(self, columns) -> Dict[str, str]:
+        """Map statement table columns onto transaction fields"""
+        # The first column matching a field wins
+        mapped_columns = {}
+        for col in columns:
+            field = _COLUMN_FIELDS.get(col.upper())
+            if field is not None:
+                mapped_columns.setdefault(field, col)
+        return mapped_columns
+    
+    def _clean_frame(self, df: pd.DataFrame, mapped_columns: Dict[str, str]) -> pd.DataFrame:
+        """Clean the mapped columns of a statement table column-wise and
+        return one row per transaction.  Every reader hands over string
+        columns with NaN for empty cells, so the ``.str`` methods are used
+        directly and propagate NaN without any casting or re-masking."""
+        out = pd.DataFrame(index=df.index)
+        
+        # Extract date (one vectorised parse instead of trying each
+        # strptime format per cell; Indian statements are day-first)
+        if 'date' in mapped_columns:
+            out['date'] = pd.to_datetime(
+                df[mapped_columns['date']], format='mixed', dayfirst=True, errors='coerce'
+            ).dt.strftime('%Y-%m-%d')
+        
+        # Extract description
+        if 'description' in mapped_columns:
+            out['description'] = df[mapped_columns['description']].str.strip()
+        
+        # Extract amounts
+        for field in ('debit', 'credit', 'balance'):
+            if field in mapped_columns:
+                out[field] = pd.to_numeric(
+                    df[mapped_columns[field]].str.replace(',', '', regex=False),
+                    errors='coerce'
+                )
+        
+        # Extract account number
+        if 'account' in mapped_columns:
+            acc = df[mapped_columns['account']].str.strip()
+            out['account_number'] = acc.where(acc.str.match(_LEADING_DIGITS_RE, na=False))
+        
+        # Keep a row only if it has a valid date *and* at least one
+        # monetary value (debit or credit).  This prevents inclusion of
+        # header lines or rows that have no financial impact.
+        if 'date' not in out:
+            return pd.DataFrame()
+        amount_ok = pd.Series(False, index=out.index)
+        for field in ('debit', 'credit'):
+            if field in out:
+                amount_ok |= out[field].notna()
+        return out[out['date'].notna() & amount_ok]
+
+# Parser reused by every task a pool worker process runs
+_worker_parser: Optional[BankStatementParser] = None
+
+def parse_tabular_statement(file_content: bytes) -> Tuple[pd.DataFrame, Optional[str]]:
+    """Process pool entry point for Excel statements; only the bytes are
+    pickled and the parser lives in the worker.
+
+    Returns the transactions and, for a sheet without any, its text for
+    the fallback parse (see ``parse_excel_statement``).
+    """
+    global _worker_parser
+    if _worker_parser is None:
+        _worker_parser = BankStatementParser()
+    return _worker_parser.parse_excel_statement(file_content)
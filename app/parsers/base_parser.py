@@ -1,18 +1,89 @@
+import asyncio
+import hashlib
+import io
 import os
 import logging
+import threading
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, Iterator, List, Optional
+import orjson
 import pandas as pd
-import PyPDF2
-import pdfplumber
-from openpyxl import load_workbook
+from langchain_google_genai import ChatGoogleGenerativeAI
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Seconds the startup warm-up call may take before it is abandoned
+LLM_WARMUP_TIMEOUT = 10
+
+# Narrowest PDF table treated as tabular statement data
+MIN_TABLE_COLUMNS = 3
+
+# Upper bound on memoised LLM parse results
+LLM_CACHE_SIZE = 1024
+
+# Gemini client shared by every parser, created on first use
+_LLM: Optional[ChatGoogleGenerativeAI] = None
+_LLM_LOCK = threading.Lock()
+
+def get_llm() -> ChatGoogleGenerativeAI:
+    """Return the shared Gemini client"""
+    global _LLM
+    if _LLM is None:
+        # Parsers are built from worker threads too; the lock keeps two of
+        # them from each creating (and then discarding) a client
+        with _LLM_LOCK:
+            if _LLM is None:
+                _LLM = ChatGoogleGenerativeAI(
+                    google_api_key=settings.google_api_key,
+                    model="gemini-pro",
+                    temperature=0,
+                    convert_system_message_to_human=True
+                )
+    return _LLM
+
+async def warm_up_llm():
+    """Open the Gemini connection on queue worker startup so the first job does not pay for it"""
+    try:
+        await asyncio.wait_for(get_llm().ainvoke("ping"), timeout=LLM_WARMUP_TIMEOUT)
+        logger.info("Gemini client warmed up")
+    except asyncio.TimeoutError:
+        logger.error(f"Gemini warm-up timed out after {LLM_WARMUP_TIMEOUT}s")
+    except Exception as e:
+        # A cold client still works, so never block startup on this
+        logger.error(f"Failed to warm up Gemini client: {e}")
+
+def clean_text(value: Any) -> Optional[str]:
+    """Strip a free-text field extracted by the LLM; blank values become None"""
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+def clean_amount(value: Any) -> Optional[float]:
+    """Coerce an LLM amount such as "1,250.00" to a float; zero and junk become None"""
+    if not value:
+        return None
+    if type(value) in (int, float):
+        # JSON numbers need no string round trip (bools are excluded)
+        return float(value)
+    try:
+        return float(str(value).replace(',', '')) or None
+    except ValueError:
+        return None
+
 class BaseParser(ABC):
     """Base class for all file parsers"""
     
+    # Cleaned LLM results keyed by parser and a digest of the input text,
+    # shared by all instances so repeated documents skip Gemini entirely
+    _llm_cache: Dict[str, Dict[str, Any]] = {}
+    _llm_cache_lock = threading.Lock()
+    # LLM requests currently running, so identical concurrent uploads
+    # share one call instead of each paying for their own
+    _llm_inflight: Dict[str, Future] = {}
+    
     def __init__(self):
         self.supported_extensions = {
             '.pdf': self._parse_pdf,
@@ -21,10 +92,12 @@ class BaseParser(ABC):
             '.xls': self._parse_excel
         }
     
-    def parse_file(self, file_path: str, file_content: bytes) -> Dict[str, Any]:
+    def parse_file(self, file_path: str, file_content: bytes, file_extension: Optional[str] = None) -> Dict[str, Any]:
         """Main parsing method that routes to appropriate parser based on file extension"""
         try:
-            file_extension = os.path.splitext(file_path)[1].lower()
+            # Callers that already validated the upload pass its extension in
+            if file_extension is None:
+                file_extension = os.path.splitext(file_path)[1].lower()
             
             if file_extension not in self.supported_extensions:
                 raise ValueError(f"Unsupported file type: {file_extension}")
@@ -33,53 +106,82 @@ class BaseParser(ABC):
             raw_text = self.supported_extensions[file_extension](file_content)
             
             # Parse the extracted text
-            parsed_data = self._parse_content(raw_text)
-            
-            return {
-                "raw_text": raw_text,
-                "parsed_data": parsed_data,
-                "file_type": file_extension
-            }
+            return self.parse_text(raw_text, file_extension)
             
         except Exception as e:
             logger.error(f"Error parsing file {file_path}: {e}")
             raise
     
+    def parse_text(self, raw_text: str, file_extension: str) -> Dict[str, Any]:
+        """Parse text already extracted from a file, as ``parse_file`` does"""
+        return {
+            "raw_text": raw_text,
+            "parsed_data": self._parse_content(raw_text),
+            "file_type": file_extension
+        }
+    
     def _parse_pdf(self, file_content: bytes) -> str:
         """Extract text from PDF files"""
+        return "".join(page + "\n" for page in self._extract_pdf_pages(file_content))
+    
+    def _extract_pdf_pages(self, file_content: bytes) -> Iterator[str]:
+        """Lazily yield the text of each non-empty page of a PDF file"""
         try:
-            # Try pdfplumber first for better text extraction
-            with pdfplumber.open(file_content) as pdf:
-                text = ""
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                
-                if text.strip():
-                    return text
-            
-            # Fallback to PyPDF2
-            pdf_file = PyPDF2.PdfReader(file_content)
-            text = ""
-            for page in pdf_file.pages:
-                text += page.extract_text() + "\n"
+            # PyMuPDF's C extractor is several times faster than the
+            # pure-Python libraries and reads the bytes without a copy.
+            # The PDF libraries are imported on first use so processes
+            # that never see a PDF do not load them
+            import fitz
+            found_text = False
+            with fitz.open(stream=file_content, filetype="pdf") as doc:
+                for page in doc:
+                    text = page.get_text()
+                    if text and text.strip():
+                        found_text = True
+                        yield text
+            if found_text:
+                return
             
-            return text
+            # Fallback to pdfplumber for layouts MuPDF could not read
+            import pdfplumber
+            with pdfplumber.open(io.BytesIO(file_content)) as pdf:
+                for page in pdf.pages:
+                    text = page.extract_text()
+                    # Drop the page's parsed layout objects once it is read
+                    page.flush_cache()
+                    if text and text.strip():
+                        yield text
             
         except Exception as e:
             logger.error(f"Error parsing PDF: {e}")
             raise
     
+    def _try_extract_tables(self, file_content: bytes) -> Optional[pd.DataFrame]:
+        """Collect the rows of every table in a PDF, or None when it has none.
+
+        No header row is assigned and cells stay strings (None when empty),
+        matching ``pd.read_excel(header=None, dtype=str)``.
+        """
+        try:
+            import pdfplumber
+            rows: List[list] = []
+            with pdfplumber.open(io.BytesIO(file_content)) as pdf:
+                for page in pdf.pages:
+                    for table in page.extract_tables():
+                        if table and len(table[0]) >= MIN_TABLE_COLUMNS:
+                            rows.extend(table)
+                    page.flush_cache()
+            return pd.DataFrame(rows, dtype=object) if rows else None
+        except Exception as e:
+            logger.error(f"Error extracting PDF tables: {e}")
+            return None
+    
     def _parse_csv(self, file_content: bytes) -> str:
         """Extract text from CSV files"""
         try:
-            # Read CSV content
-            df = pd.read_csv(file_content)
-            
-            # Convert to string representation
-            text = df.to_string(index=False)
-            return text
+            # A CSV file already is its own compact text representation, so
+            # decode it instead of parsing it into a frame and printing it
+            return file_content.decode('utf-8-sig', errors='replace')
             
         except Exception as e:
             logger.error(f"Error parsing CSV: {e}")
@@ -88,17 +190,72 @@ class BaseParser(ABC):
     def _parse_excel(self, file_content: bytes) -> str:
         """Extract text from Excel files"""
         try:
-            # Read Excel content
-            df = pd.read_excel(file_content)
+            # Read Excel content; cells stay strings, no type inference
+            df = pd.read_excel(io.BytesIO(file_content), dtype=str)
             
-            # Convert to string representation
-            text = df.to_string(index=False)
+            # CSV text is far smaller than the padded to_string() layout
+            text = df.to_csv(index=False)
             return text
             
         except Exception as e:
             logger.error(f"Error parsing Excel: {e}")
             raise
     
+    def _format_hint(self, known: Dict[str, Any]) -> str:
+        """Render fields already found by the regex parser as a prompt suffix"""
+        if not known:
+            return ""
+        return f"\n\nKnown so far, verify these and fill in the rest: {orjson.dumps(known).decode()}"
+    
+    def _llm_cache_key(self, raw_text: str) -> str:
+        """Digest identifying an LLM request; the parser class selects the prompt"""
+        digest = hashlib.blake2b(raw_text.encode('utf-8'), digest_size=16).hexdigest()
+        return f"{type(self).__name__}:{digest}"
+    
+    def _get_cached_result(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of a memoised LLM result, if any"""
+        cached = self._llm_cache.get(key)
+        return dict(cached) if cached is not None else None
+    
+    def _cache_result(self, key: str, data: Dict[str, Any]):
+        """Memoise a cleaned LLM result, evicting the oldest entry when full"""
+        with self._llm_cache_lock:
+            if key not in self._llm_cache and len(self._llm_cache) >= LLM_CACHE_SIZE:
+                # Evict the oldest entry (dicts keep insertion order)
+                self._llm_cache.pop(next(iter(self._llm_cache)))
+            self._llm_cache[key] = dict(data)
+    
+    def _collapse_llm_call(self, key: str, call: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Run ``call`` at most once at a time per cache key.
+
+        Callers arriving while it runs wait for that result (or exception)
+        instead of issuing the same request again.  ``call`` is expected to
+        store its result with ``_cache_result`` before returning.
+        """
+        with self._llm_cache_lock:
+            # Re-check under the lock: the previous owner may have just finished
+            cached = self._llm_cache.get(key)
+            if cached is not None:
+                return dict(cached)
+            future = self._llm_inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._llm_inflight[key] = Future()
+        
+        if not owner:
+            return dict(future.result())
+        
+        try:
+            result = call()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._llm_cache_lock:
+                self._llm_inflight.pop(key, None)
+    
     @abstractmethod
     def _parse_content(self, raw_text: str) -> Dict[str, Any]:
         """Abstract method to be implemented by specific parsers"""
@@ -2,16 +2,50 @@ import logging
 import re
 from datetime import datetime
 from typing import Dict, Any, Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
-from app.parsers.base_parser import BaseParser
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from app.parsers.base_parser import BaseParser, clean_amount, clean_text, get_llm
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Regexes are compiled once at import instead of on every call
+_ISO_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_GSTIN_RE = re.compile(r'^\d{2}[A-Z]{5}\d{4}[A-Z]{1}\d{1}[Z]{1}[A-Z\d]{1}$')
+
+# An invoice number is a single token holding at least one digit, so label
+# words such as "Number" or a "TAX INVOICE" heading are never captured
+_INVOICE_ID = r'((?=[A-Z\-_/]*+\d)[A-Z0-9][A-Z0-9\-_/]*+)'
+
+# Tried in order: explicitly labelled numbers first, then a bare
+# "Invoice: <id>"
+_INVOICE_NUMBER_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'\binvoice\s*+(?:(?:number|num|no)\b\.?+|\#)\s*+:?+\s*+' + _INVOICE_ID,
+    r'\bbill\s*+(?:(?:number|num|no)\b\.?+|\#)\s*+:?+\s*+' + _INVOICE_ID,
+    r'\binvoice\s*+:?+\s*+' + _INVOICE_ID,
+))
+
+# Amount patterns fused into one alternation so the raw text is scanned
+# once; "CGST + SGST" is caught by the gst branch.  "Grand total" has its
+# own branch and "subtotal" never counts as the total.
+# Possessive quantifiers keep a failed match linear in the input.
+_AMOUNT_RE = re.compile(r"""
+      \b(?:cgst\s*+\+?+\s*+s)?gst\s*+:?+\s*+[₹$]?+\s*+(?P<gst>[\d,]++\.?+\d*+)
+    | \bgrand\s*+total\s*+:?+\s*+[₹$]?+\s*+(?P<grand_total>[\d,]++\.?+\d*+)
+    | (?<!sub)(?<!sub-)(?<!sub\ )\btotal\s*+:?+\s*+[₹$]?+\s*+(?P<total>[\d,]++\.?+\d*+)
+    | \bamount\s*+:?+\s*+[₹$]?+\s*+(?P<amount>[\d,]++\.?+\d*+)
+""", re.IGNORECASE | re.VERBOSE)
+
+# Branches of _AMOUNT_RE that can fill each field, most trusted first
+_AMOUNT_FIELDS = (
+    ("invoice_total", ("grand_total", "total", "amount")),
+    ("gst_amount", ("gst",))
+)
+
 class InvoiceData(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     invoice_number: Optional[str] = Field(None, description="Invoice number or ID")
     invoice_date: Optional[str] = Field(None, description="Invoice date in YYYY-MM-DD format")
     vendor_name: Optional[str] = Field(None, description="Name of the vendor or supplier")
@@ -22,153 +56,137 @@ class InvoiceData(BaseModel):
     payment_terms: Optional[str] = Field(None, description="Payment terms if mentioned")
     invoice_currency: Optional[str] = Field(None, description="Currency of the invoice")
     items: Optional[list] = Field(None, description="List of items with descriptions and amounts")
+    
+    # The LLM output is cleaned while it is validated, so a response never
+    # needs a second pass; values that fail a check are dropped, not errors
+    @field_validator("invoice_date", mode="before")
+    @classmethod
+    def check_date(cls, value: Any) -> Optional[str]:
+        text = clean_text(value)
+        return text if text and _ISO_DATE_RE.match(text) else None
+    
+    @field_validator("vendor_gstin", mode="before")
+    @classmethod
+    def check_gstin(cls, value: Any) -> Optional[str]:
+        text = clean_text(value)
+        return text if text and _GSTIN_RE.match(text) else None
+    
+    @field_validator("invoice_number", "vendor_name", "payment_terms", "invoice_currency", mode="before")
+    @classmethod
+    def strip_text(cls, value: Any) -> Optional[str]:
+        return clean_text(value)
+    
+    @field_validator("taxable_value", "gst_amount", "invoice_total", mode="before")
+    @classmethod
+    def parse_amount(cls, value: Any) -> Optional[float]:
+        return clean_amount(value)
+    
+    @field_validator("items", mode="before")
+    @classmethod
+    def check_items(cls, value: Any) -> Optional[list]:
+        return value if value and isinstance(value, list) else None
+
+# Output parser shared by every instance; it holds no per-call state
+_OUT_PARSER = PydanticOutputParser(pydantic_object=InvoiceData)
+# The schema never changes, so its JSON instructions are rendered once
+_FORMAT_INSTRUCTIONS = _OUT_PARSER.get_format_instructions()
+
+# Field extraction instructions sent as the system message
+_SYSTEM_PROMPT = """You are an expert at extracting invoice information from text.
+Extract the following fields from the provided invoice text:
+- Invoice number
+- Invoice date (convert to YYYY-MM-DD format)
+- Vendor name
+- Vendor GSTIN
+- Taxable value (amount before GST)
+- GST amount
+- Invoice total
+- Payment terms
+- Currency
+- List of items (if available)
+
+If a field is not found, return null for that field.
+For amounts, extract only the numeric value without currency symbols.
+For dates, ensure they are in YYYY-MM-DD format."""
 
 class InvoiceParser(BaseParser):
     def __init__(self):
         super().__init__()
-        self.llm = ChatGoogleGenerativeAI(
-            google_api_key=settings.google_api_key,
-            model="gemini-pro",
-            temperature=0,
-            convert_system_message_to_human=True
-        )
-        self.parser = PydanticOutputParser(pydantic_object=InvoiceData)
+        self.llm = get_llm()
+        self.parser = _OUT_PARSER
+        # The prompt and chain are built once and reused for every call
+        self._chain = self._build_prompt() | self.llm | self.parser
+    
+    def _build_prompt(self) -> ChatPromptTemplate:
+        """Create prompt for invoice parsing"""
+        return ChatPromptTemplate.from_messages([
+            ("system", _SYSTEM_PROMPT + "\n\n{format_instructions}"),
+            ("user", "Please extract invoice information from this text:\n\n{text}{hint}")
+        ]).partial(format_instructions=_FORMAT_INSTRUCTIONS, hint="")
     
     def _parse_content(self, raw_text: str) -> Dict[str, Any]:
         """Parse invoice content using Google Gemini"""
-        try:
-            # Create prompt for invoice parsing
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", """You are an expert at extracting invoice information from text. 
-                Extract the following fields from the provided invoice text:
-                - Invoice number
-                - Invoice date (convert to YYYY-MM-DD format)
-                - Vendor name
-                - Vendor GSTIN
-                - Taxable value (amount before GST)
-                - GST amount
-                - Invoice total
-                - Payment terms
-                - Currency
-                - List of items (if available)
-                
-                If a field is not found, return null for that field.
-                For amounts, extract only the numeric value without currency symbols.
-                For dates, ensure they are in YYYY-MM-DD format."""),
-                ("user", "Please extract invoice information from this text:\n\n{text}")
-            ])
-            
+        cache_key = self._llm_cache_key(raw_text)
+        cached = self._get_cached_result(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Well-formatted text is fully handled by the regex parser, so the
+        # LLM is only consulted for what it could not find
+        known = self._fallback_parse(raw_text)
+        if self._is_complete(known):
+            self._cache_result(cache_key, known)
+            return known
+        
+        def ask_llm() -> Dict[str, Any]:
             # Get response from Gemini
-            chain = prompt | self.llm | self.parser
-            result = chain.invoke({"text": raw_text})
-            
-            # Convert to dictionary
-            parsed_data = result.dict()
-            
-            # Clean and validate data
-            parsed_data = self._clean_invoice_data(parsed_data)
+            result = self._chain.invoke({"text": raw_text, "hint": self._format_hint(known)})
             
+            # The model's validators already cleaned every field; regex
+            # values fill whatever it left out
+            parsed_data = {**known, **result.model_dump(exclude_none=True)}
+            self._cache_result(cache_key, parsed_data)
             return parsed_data
+        
+        try:
+            # Identical documents parsed concurrently share one Gemini call
+            return self._collapse_llm_call(cache_key, ask_llm)
             
         except Exception as e:
             logger.error(f"Error parsing invoice content: {e}")
             # Fallback to basic regex extraction
-            return self._fallback_parse(raw_text)
+            return known
     
-    def _clean_invoice_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Clean and validate extracted invoice data"""
-        cleaned_data = {}
-        
-        # Clean invoice number
-        if data.get("invoice_number"):
-            cleaned_data["invoice_number"] = str(data["invoice_number"]).strip()
-        
-        # Clean and validate date
-        if data.get("invoice_date"):
-            try:
-                # Try to parse the date
-                date_str = str(data["invoice_date"]).strip()
-                if re.match(r'\d{4}-\d{2}-\d{2}', date_str):
-                    cleaned_data["invoice_date"] = date_str
-            except:
-                pass
-        
-        # Clean vendor name
-        if data.get("vendor_name"):
-            cleaned_data["vendor_name"] = str(data["vendor_name"]).strip()
-        
-        # Clean GSTIN
-        if data.get("vendor_gstin"):
-            gstin = str(data["vendor_gstin"]).strip()
-            if re.match(r'^\d{2}[A-Z]{5}\d{4}[A-Z]{1}\d{1}[Z]{1}[A-Z\d]{1}$', gstin):
-                cleaned_data["vendor_gstin"] = gstin
-        
-        # Clean numeric values
-        for field in ["taxable_value", "gst_amount", "invoice_total"]:
-            if data.get(field):
-                try:
-                    value = float(str(data[field]).replace(',', ''))
-                    cleaned_data[field] = value
-                except:
-                    pass
-        
-        # Clean other fields
-        for field in ["payment_terms", "invoice_currency"]:
-            if data.get(field):
-                cleaned_data[field] = str(data[field]).strip()
-        
-        # Clean items list
-        if data.get("items") and isinstance(data["items"], list):
-            cleaned_data["items"] = data["items"]
-        
-        return cleaned_data
+    def _is_complete(self, data: Dict[str, Any]) -> bool:
+        """Whether a regex parse already holds every field an invoice needs"""
+        return bool(data.get("invoice_number") and data.get("invoice_total"))
     
     def _fallback_parse(self, raw_text: str) -> Dict[str, Any]:
         """Fallback parsing using regex patterns"""
         data = {}
         
         # Extract invoice number patterns
-        invoice_patterns = [
-            r'invoice\s*#?\s*:?\s*([A-Z0-9\-_]+)',
-            r'invoice\s*number\s*:?\s*([A-Z0-9\-_]+)',
-            r'bill\s*#?\s*:?\s*([A-Z0-9\-_]+)'
-        ]
-        
-        for pattern in invoice_patterns:
-            match = re.search(pattern, raw_text, re.IGNORECASE)
+        for pattern in _INVOICE_NUMBER_PATTERNS:
+            match = pattern.search(raw_text)
             if match:
                 data["invoice_number"] = match.group(1).strip()
                 break
         
-        # Extract amounts
-        amount_patterns = [
-            r'total\s*:?\s*[₹$]?\s*([\d,]+\.?\d*)',
-            r'amount\s*:?\s*[₹$]?\s*([\d,]+\.?\d*)',
-            r'grand\s*total\s*:?\s*[₹$]?\s*([\d,]+\.?\d*)'
-        ]
-        
-        for pattern in amount_patterns:
-            match = re.search(pattern, raw_text, re.IGNORECASE)
-            if match:
+        # Extract invoice total and GST amount, keeping the first usable
+        # value of each branch
+        amounts = {}
+        for match in _AMOUNT_RE.finditer(raw_text):
+            kind = match.lastgroup
+            if kind not in amounts:
                 try:
-                    data["invoice_total"] = float(match.group(1).replace(',', ''))
-                    break
-                except:
+                    amounts[kind] = float(match.group(kind).replace(',', ''))
+                except ValueError:
                     continue
         
-        # Extract GST amount
-        gst_patterns = [
-            r'gst\s*:?\s*[₹$]?\s*([\d,]+\.?\d*)',
-            r'cgst\s*\+?\s*sgst\s*:?\s*[₹$]?\s*([\d,]+\.?\d*)'
-        ]
-        
-        for pattern in gst_patterns:
-            match = re.search(pattern, raw_text, re.IGNORECASE)
-            if match:
-                try:
-                    data["gst_amount"] = float(match.group(1).replace(',', ''))
+        for field, kinds in _AMOUNT_FIELDS:
+            for kind in kinds:
+                if kind in amounts:
+                    data[field] = amounts[kind]
                     break
-                except:
-                    continue
         
         return data 
\ No newline at end of file
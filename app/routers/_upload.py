@@ -0,0 +1,177 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import uuid
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Coroutine
+from fastapi import BackgroundTasks, HTTPException, UploadFile
+from app.models import UploadResponse, ParsingStatus
+from app.database import db, ServiceUnavailableError
+from app.jobs import parse_queue
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Copy buffer used when moving an upload out of the request's spool file
+COPY_BUFFER_SIZE = 1 << 20
+
+# Every upload is checked against these, so the set and the rejection
+# message are built once from the settings
+ALLOWED_FILE_TYPES = frozenset(settings.allowed_file_types)
+UNSUPPORTED_TYPE_DETAIL = f"Unsupported file type. Allowed types: {', '.join(settings.allowed_file_types)}"
+
+def upload_size(file: UploadFile) -> int:
+    """Size of an upload in bytes, measured without reading it into memory"""
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+def _copy_to_temp(file: UploadFile) -> str:
+    with tempfile.NamedTemporaryFile(
+        prefix="trustbooks-", dir=settings.upload_spool_dir or None, delete=False
+    ) as tmp:
+        shutil.copyfileobj(file.file, tmp, COPY_BUFFER_SIZE)
+    file.file.seek(0)
+    return tmp.name
+
+async def spool_upload(file: UploadFile) -> str:
+    """Copy an upload to a temporary file that outlives the request and return its path.
+
+    Background tasks take the path instead of the file's bytes, so an
+    upload waiting to be parsed is held on disk rather than in memory.
+    """
+    return await asyncio.to_thread(_copy_to_temp, file)
+
+def _read_and_remove(path: str) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+async def load_spooled(path: str) -> bytes:
+    """Read back a file written by ``spool_upload`` and delete it"""
+    return await asyncio.to_thread(_read_and_remove, path)
+
+def discard_spooled(path: str):
+    """Delete a spooled upload that will not be parsed"""
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.error(f"Failed to remove spooled upload {path}: {e}")
+
+@dataclass(frozen=True)
+class UploadTarget:
+    """What differs between the upload endpoints"""
+    label: str            # human-readable document kind, e.g. "invoice"
+    table: str            # table holding one record per uploaded file
+    folder: str           # storage folder the file path is built under
+    job: str              # parse queue job name
+    parse_task: Callable[..., Coroutine[Any, Any, None]]
+    store_file: bool      # whether the file itself goes to Supabase storage
+
+async def handle_upload(target: UploadTarget, file: UploadFile,
+                        background_tasks: BackgroundTasks) -> UploadResponse:
+    """Validate an upload, record it and queue it for parsing"""
+    spool_path = None
+    queued = False
+    try:
+        # Validate file
+        if not file.filename:
+            raise HTTPException(status_code=400, detail="No file provided")
+        
+        # Check file extension first; it needs only the filename
+        file_extension = os.path.splitext(file.filename)[1].lower()
+        if file_extension not in ALLOWED_FILE_TYPES:
+            raise HTTPException(status_code=400, detail=UNSUPPORTED_TYPE_DETAIL)
+        
+        # Check file size; Starlette records it while spooling the upload,
+        # so the file only has to be measured when that is missing
+        size = file.size if file.size is not None else upload_size(file)
+        if size > settings.max_file_size:
+            raise HTTPException(
+                status_code=413, 
+                detail=f"File size exceeds maximum allowed size of {settings.max_file_size} bytes"
+            )
+        
+        # Move the body out of the request so the background task does not
+        # keep it in memory while it waits
+        spool_path = await spool_upload(file)
+        
+        # Generate unique file path
+        file_id = str(uuid.uuid4())
+        file_path = f"{target.folder}/{file_id}_{file.filename}"
+        
+        # Upload file to Supabase storage
+        if target.store_file:
+            try:
+                # Streamed from the request's spool file, never read whole
+                await db.upload_file(
+                    file_path=file_path,
+                    file=file.file,
+                    size=size,
+                    content_type=file.content_type
+                )
+            except ServiceUnavailableError as e:
+                logger.error(f"Storage unavailable, rejecting upload: {e}")
+                raise HTTPException(status_code=503, detail="Storage temporarily unavailable")
+            except Exception as e:
+                logger.error(f"Failed to upload file to storage: {e}")
+                raise HTTPException(status_code=500, detail="Failed to upload file to storage")
+        
+        # Create initial database record; both timestamps share one clock read
+        now_iso = datetime.utcnow().isoformat()
+        record = {
+            "id": file_id,
+            "file_path": file_path,
+            "status": ParsingStatus.PROCESSING.value,
+            "created_at": now_iso,
+            "updated_at": now_iso
+        }
+        
+        try:
+            await db.queue_insert(target.table, record)
+        except ServiceUnavailableError as e:
+            logger.error(f"Database unavailable, rejecting upload: {e}")
+            raise HTTPException(status_code=503, detail="Database temporarily unavailable")
+        except Exception as e:
+            logger.error(f"Failed to create {target.label} record: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to create {target.label} record")
+        
+        # Start background parsing task
+        try:
+            await parse_queue.enqueue(
+                background_tasks,
+                target.job,
+                target.parse_task,
+                file_id=file_id,
+                file_path=file_path,
+                spool_path=spool_path,
+                file_extension=file_extension
+            )
+            queued = True
+        except Exception as e:
+            logger.error(f"Failed to queue {target.label} {file_id} for parsing: {e}")
+            raise HTTPException(status_code=503, detail="Parsing queue temporarily unavailable")
+        
+        return UploadResponse(
+            message=f"{target.label.capitalize()} uploaded successfully. Parsing in progress.",
+            file_id=file_id,
+            file_path=file_path,
+            status=ParsingStatus.PROCESSING
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error uploading {target.label}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        # Once queued the parse task owns the spooled file; on any earlier
+        # failure nothing else will remove it
+        if spool_path is not None and not queued:
+            discard_spooled(spool_path)
@@ -1,17 +1,41 @@
-import os
-import uuid
+import asyncio
+import functools
 import logging
 from datetime import datetime
-from typing import List
+from typing import TYPE_CHECKING, List, Union
+import pandas as pd
 from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
 from app.models import UploadResponse, BankStatementResponse, ParsingStatus
 from app.database import db
-from app.parsers.bank_statement_parser import BankStatementParser
-from app.config import settings
+from app.executor import parser_pool
+from app.routers._upload import UploadTarget, handle_upload, load_spooled
+
+if TYPE_CHECKING:
+    from app.parsers.bank_statement_parser import BankStatementParser
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Statement formats parsed structurally, without the LLM
+TABULAR_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+# Parser fields stored under a different bank_statements column
+TRANSACTION_COLUMNS = {"date": "txn_date"}
+
+# Parsed fields copied onto the statement record when they have a value
+STATEMENT_FIELDS = (
+    "txn_date", "description", "debit", "credit", "balance",
+    "account_number", "mode", "category", "meta_data"
+)
+
+@functools.lru_cache(maxsize=1)
+def _statement_parser() -> "BankStatementParser":
+    """Return the parser instance shared by every parsing task"""
+    # Imported here rather than at module load so the PDF and LLM
+    # libraries are only loaded once the first upload is parsed
+    from app.parsers.bank_statement_parser import BankStatementParser
+    return BankStatementParser()
+
 @router.post("/upload-bank-statement", response_model=UploadResponse)
 async def upload_bank_statement(
     background_tasks: BackgroundTasks,
@@ -20,123 +44,58 @@ async def upload_bank_statement(
     """
     Upload and parse a bank statement file (PDF, CSV, Excel)
     """
-    try:
-        # Validate file
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="No file provided")
-        
-        # Check file size
-        file_content = await file.read()
-        if len(file_content) > settings.max_file_size:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"File size exceeds maximum allowed size of {settings.max_file_size} bytes"
-            )
-        
-        # Check file extension
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        if file_extension not in settings.allowed_file_types:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Unsupported file type. Allowed types: {', '.join(settings.allowed_file_types)}"
-            )
-        
-        # Generate unique file path
-        file_id = str(uuid.uuid4())
-        file_path = f"bank_statements/{file_id}_{file.filename}"
-        
-        # Upload file to Supabase storage
-        # try:
-        #     db.upload_file(
-        #         file_path=file_path,
-        #         file_content=file_content,
-        #         content_type=file.content_type
-        #     )
-        # except Exception as e:
-        #     logger.error(f"Failed to upload file to storage: {e}")
-        #     raise HTTPException(status_code=500, detail="Failed to upload file to storage")
-        
-        # Create initial database record
-        statement_data = {
-            "id": file_id,
-            "file_path": file_path,
-            "status": ParsingStatus.PROCESSING.value,
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        
-        try:
-            db.insert_bank_statement(statement_data)
-        except Exception as e:
-            logger.error(f"Failed to create bank statement record: {e}")
-            raise HTTPException(status_code=500, detail="Failed to create bank statement record")
-        
-        # Start background parsing task
-        background_tasks.add_task(
-            parse_bank_statement_background,
-            file_id=file_id,
-            file_path=file_path,
-            file_content=file_content,
-            file_extension=file_extension
-        )
-        
-        return UploadResponse(
-            message="Bank statement uploaded successfully. Parsing in progress.",
-            file_id=file_id,
-            file_path=file_path,
-            status=ParsingStatus.PROCESSING
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Unexpected error in upload_bank_statement: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+    return await handle_upload(STATEMENT_UPLOAD, file, background_tasks)
 
 async def parse_bank_statement_background(
     file_id: str,
     file_path: str,
-    file_content: bytes,
+    spool_path: str,
     file_extension: str
 ):
     """Background task to parse bank statement file"""
     try:
-        # Initialize parser
-        parser = BankStatementParser()
+        file_content = await load_spooled(spool_path)
+        
+        # Shared parser; its prompts and Gemini chains are built only once
+        parser = _statement_parser()
         
-        # For CSV files, use specialized parsing
+        # CSV and Excel statements are tabular, so parse them directly and
+        # only fall back to the LLM when no transactions could be extracted.
+        # Parsing is blocking work and must not run on the event loop.
         if file_extension == '.csv':
-            transactions = parser.parse_csv_statement(file_content)
-            if transactions:
-                # Process multiple transactions
-                for i, transaction in enumerate(transactions):
-                    transaction_id = f"{file_id}_txn_{i}"
-                    transaction_data = {
-                        "id": transaction_id,
-                        "file_path": file_path,
-                        "status": ParsingStatus.PARSED.value,
-                        "created_at": datetime.utcnow().isoformat(),
-                        "updated_at": datetime.utcnow().isoformat()
-                    }
-                    transaction_data.update(transaction)
-                    
-                    # Insert transaction record
-                    db.insert_bank_statement(transaction_data)
-                
-                # Update main record status
-                db.update_bank_statement_status(
-                    file_id, 
-                    ParsingStatus.PARSED.value,
-                    {"updated_at": datetime.utcnow().isoformat()}
-                )
+            # CSV chunks are inserted as they are parsed, so the whole
+            # statement is never held as one table. They are read on a
+            # thread, not in the parser pool: a chunk generator cannot
+            # cross a process boundary, and Arrow's reader parses on its
+            # own threads outside the GIL
+            if not await _stream_csv_transactions(parser, file_id, file_path, file_content):
+                # Fallback to general parsing
+                parse_result = await asyncio.to_thread(parser.parse_file, file_path, file_content, file_extension)
+                await _update_statement_data(file_id, parse_result)
+        elif file_extension in TABULAR_EXTENSIONS:
+            from app.parsers.bank_statement_parser import parse_tabular_statement
+            transactions, raw_text = await parser_pool.run(parse_tabular_statement, file_content)
+            if not transactions.empty:
+                await _store_transactions(file_id, file_path, transactions)
+            elif raw_text is not None:
+                # Fallback to general parsing of the sheet that was already read
+                parse_result = await asyncio.to_thread(parser.parse_text, raw_text, file_extension)
+                await _update_statement_data(file_id, parse_result)
             else:
                 # Fallback to general parsing
-                parse_result = parser.parse_file(file_path, file_content)
+                parse_result = await asyncio.to_thread(parser.parse_file, file_path, file_content, file_extension)
                 await _update_statement_data(file_id, parse_result)
         else:
-            # Use general parsing for PDF and Excel
-            parse_result = parser.parse_file(file_path, file_content)
-            await _update_statement_data(file_id, parse_result)
+            # PDFs with a ruled transaction table are read from it; others
+            # go through the LLM, multi-page statements as one transaction
+            # per page
+            parse_result = await asyncio.to_thread(parser.parse_pdf_statement, file_content)
+            if len(parse_result["transactions"]):
+                await _store_transactions(
+                    file_id, file_path, parse_result["transactions"], raw_text=parse_result["raw_text"]
+                )
+            else:
+                await _update_statement_data(file_id, parse_result)
         
         logger.info(f"Successfully parsed bank statement {file_id}")
         
@@ -144,7 +103,7 @@ async def parse_bank_statement_background(
         logger.error(f"Error parsing bank statement {file_id}: {e}")
         # Update status to error
         try:
-            db.update_bank_statement_status(
+            await db.update_bank_statement_status(
                 file_id, 
                 ParsingStatus.ERROR.value,
                 {"updated_at": datetime.utcnow().isoformat()}
@@ -152,6 +111,73 @@ async def parse_bank_statement_background(
         except Exception as update_error:
             logger.error(f"Failed to update error status for bank statement {file_id}: {update_error}")
 
+# Bank statement files are not kept in storage; only their records are
+STATEMENT_UPLOAD = UploadTarget(
+    label="bank statement",
+    table="bank_statements",
+    folder="bank_statements",
+    job="parse_bank_statement",
+    parse_task=parse_bank_statement_background,
+    store_file=False
+)
+
+async def _store_transactions(file_id: str, file_path: str, transactions: Union[pd.DataFrame, List[dict]],
+                              raw_text: str = None):
+    """Helper function to insert parsed transactions and mark the statement parsed"""
+    await db.commit_bank_statement(file_id, _transaction_rows(file_id, file_path, transactions), raw_text)
+
+def _transaction_rows(file_id: str, file_path: str, transactions: Union[pd.DataFrame, List[dict]],
+                      start: int = 0) -> pd.DataFrame:
+    """Add the record columns to a table of transactions numbered from ``start``"""
+    # The columns are added to the whole table at once; rows only become
+    # dicts inside the insert chunker
+    if isinstance(transactions, list):
+        transactions = pd.DataFrame(transactions)
+    now_iso = datetime.utcnow().isoformat()
+    return transactions.rename(columns=TRANSACTION_COLUMNS).assign(
+        id=[f"{file_id}_txn_{i}" for i in range(start, start + len(transactions))],
+        file_path=file_path,
+        status=ParsingStatus.PARSED.value,
+        created_at=now_iso,
+        updated_at=now_iso
+    )
+
+async def _stream_csv_transactions(parser: "BankStatementParser", file_id: str, file_path: str,
+                                   file_content: bytes) -> int:
+    """Store a CSV statement chunk by chunk and return how many transactions were stored.
+
+    Each chunk is inserted while a later one is being parsed; the last
+    chunk is committed together with the statement's status update.
+    Nothing is written, and 0 returned, when the file has no transactions.
+    """
+    chunks = parser.iter_csv_statement(file_content)
+    read_next = functools.partial(asyncio.to_thread, next, chunks, None)
+    
+    stored = 0
+    current = await read_next()
+    if current is None:
+        return 0
+    reading = asyncio.ensure_future(read_next())
+    while True:
+        upcoming = await reading
+        if upcoming is None:
+            break
+        # Parse the chunk after next while this one is being inserted
+        reading = asyncio.ensure_future(read_next())
+        try:
+            rows = _transaction_rows(file_id, file_path, current, start=stored)
+            # The stored rows are not read back, so skip echoing them over the wire
+            await db.insert_bank_statements_bulk(rows, returning=False)
+        except Exception:
+            # Let the reader thread finish before giving up on the file
+            await asyncio.gather(reading, return_exceptions=True)
+            raise
+        stored += len(rows)
+        current = upcoming
+    
+    await db.commit_bank_statement(file_id, _transaction_rows(file_id, file_path, current, start=stored))
+    return stored + len(current)
+
 async def _update_statement_data(file_id: str, parse_result: dict):
     """Helper function to update bank statement data"""
     parsed_data = parse_result.get("parsed_data", {})
@@ -165,27 +191,10 @@ async def _update_statement_data(file_id: str, parse_result: dict):
     }
     
     # Add parsed fields if available
-    if parsed_data.get("txn_date"):
-        update_data["txn_date"] = parsed_data["txn_date"]
-    if parsed_data.get("description"):
-        update_data["description"] = parsed_data["description"]
-    if parsed_data.get("debit"):
-        update_data["debit"] = parsed_data["debit"]
-    if parsed_data.get("credit"):
-        update_data["credit"] = parsed_data["credit"]
-    if parsed_data.get("balance"):
-        update_data["balance"] = parsed_data["balance"]
-    if parsed_data.get("account_number"):
-        update_data["account_number"] = parsed_data["account_number"]
-    if parsed_data.get("mode"):
-        update_data["mode"] = parsed_data["mode"]
-    if parsed_data.get("category"):
-        update_data["category"] = parsed_data["category"]
-    if parsed_data.get("meta_data"):
-        update_data["meta_data"] = parsed_data["meta_data"]
+    update_data.update({field: value for field in STATEMENT_FIELDS if (value := parsed_data.get(field))})
     
     # Update database record
-    db.update_bank_statement_status(file_id, ParsingStatus.PARSED.value, update_data)
+    await db.update_bank_statement_status(file_id, ParsingStatus.PARSED.value, update_data)
 
 @router.get("/bank-statements", response_model=List[BankStatementResponse])
 async def get_bank_statements():
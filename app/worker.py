@@ -0,0 +1,47 @@
+import logging
+from arq import func
+from arq.connections import RedisSettings
+from app.config import settings
+from app.database import db
+from app.executor import parser_pool
+from app.parsers.base_parser import warm_up_llm
+from app.routers.bank_statement_router import parse_bank_statement_background
+from app.routers.invoice_router import parse_invoice_background
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+async def parse_bank_statement(ctx, **kwargs):
+    """Queue entry point for bank statement parsing"""
+    await parse_bank_statement_background(**kwargs)
+
+async def parse_invoice(ctx, **kwargs):
+    """Queue entry point for invoice parsing"""
+    await parse_invoice_background(**kwargs)
+
+async def startup(ctx):
+    parser_pool.start()
+    await warm_up_llm()
+
+async def shutdown(ctx):
+    await db.close()
+    parser_pool.shutdown()
+
+class WorkerSettings:
+    """arq worker configuration; run with ``arq app.worker.WorkerSettings``"""
+    functions = [
+        func(parse_bank_statement, name="parse_bank_statement"),
+        func(parse_invoice, name="parse_invoice"),
+    ]
+    on_startup = startup
+    on_shutdown = shutdown
+    redis_settings = RedisSettings.from_dsn(settings.redis_url or "redis://localhost:6379")
+    # Jobs mostly wait on Gemini and Supabase, so one worker runs many
+    max_jobs = settings.parse_queue_max_jobs
+    # Large PDFs take many Gemini round trips
+    job_timeout = 15 * 60
+    # The background tasks record their own failures, so never re-run one
+    max_tries = 1
@@ -73,4 +73,56 @@ CREATE TRIGGER update_invoices_updated_at
 
 CREATE TRIGGER update_bank_statements_updated_at 
     BEFORE UPDATE ON bank_statements 
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column(); 
\ No newline at end of file
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column(); 
+
+-- Insert a statement's parsed transactions and mark the statement parsed
+-- in one transaction, so storing a parse result costs a single round trip
+CREATE OR REPLACE FUNCTION commit_bank_statement(p_file_id UUID, p_rows JSONB, p_raw_text TEXT DEFAULT NULL)
+RETURNS VOID AS $$
+DECLARE
+    unknown_key TEXT;
+BEGIN
+    -- Reject keys that are not columns, as an insert through PostgREST
+    -- would, instead of silently dropping them
+    SELECT k.key INTO unknown_key
+    FROM jsonb_array_elements(p_rows) AS r(elem), jsonb_object_keys(r.elem) AS k(key)
+    WHERE k.key <> ALL (ARRAY['id', 'file_path', 'txn_date', 'description', 'debit', 'credit', 'balance',
+                              'account_number', 'mode', 'category', 'meta_data', 'status',
+                              'created_at', 'updated_at'])
+    LIMIT 1;
+    IF unknown_key IS NOT NULL THEN
+        RAISE EXCEPTION 'Unknown bank_statements column in transaction rows: %', unknown_key;
+    END IF;
+
+    -- Columns are named explicitly; keys a row lacks fall back to the
+    -- column defaults rather than being inserted as NULL
+    INSERT INTO bank_statements (
+        id, file_path, txn_date, description, debit, credit, balance,
+        account_number, mode, category, meta_data, status, created_at, updated_at
+    )
+    SELECT COALESCE(r.id, uuid_generate_v4()), r.file_path, r.txn_date, r.description,
+           r.debit, r.credit, r.balance, r.account_number, r.mode, r.category, r.meta_data,
+           COALESCE(r.status, 'Processing'), COALESCE(r.created_at, NOW()), COALESCE(r.updated_at, NOW())
+    FROM jsonb_to_recordset(p_rows) AS r(
+        id UUID,
+        file_path TEXT,
+        txn_date DATE,
+        description TEXT,
+        debit DECIMAL(15,2),
+        credit DECIMAL(15,2),
+        balance DECIMAL(15,2),
+        account_number TEXT,
+        mode TEXT,
+        category TEXT,
+        meta_data JSONB,
+        status parsing_status,
+        created_at TIMESTAMP WITH TIME ZONE,
+        updated_at TIMESTAMP WITH TIME ZONE
+    );
+
+    UPDATE bank_statements
+    SET status = 'Parsed',
+        raw_text = COALESCE(p_raw_text, raw_text)
+    WHERE id = p_file_id;
+END;
+$$ language 'plpgsql';
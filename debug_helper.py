@@ -6,56 +6,40 @@ Debug helper utilities for TrustBooks Backend
 import json
 import logging
 from typing import Any, Dict
-from datetime import datetime
 
-# Configure debug logging
-logging.basicConfig(level=logging.DEBUG)
+# Logging is configured by the application; importing this module must not
+# switch the whole process to DEBUG
 logger = logging.getLogger(__name__)
 
+def _to_json(data: Any) -> str:
+    """Pretty-print debug data, stringifying values JSON cannot encode"""
+    return json.dumps(data, indent=2, default=str)
+
 def debug_request(request_data: Dict[str, Any], label: str = "REQUEST"):
     """Debug helper to log request data"""
-    print(f"\n🔍 {label} DEBUG:")
-    print("=" * 50)
-    print(f"Timestamp: {datetime.now().isoformat()}")
-    print(f"Data: {json.dumps(request_data, indent=2, default=str)}")
-    print("=" * 50)
+    # Nothing is serialised unless DEBUG logging is actually on
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🔍 %s DEBUG: %s", label, _to_json(request_data))
 
 def debug_response(response_data: Dict[str, Any], label: str = "RESPONSE"):
     """Debug helper to log response data"""
-    print(f"\n📤 {label} DEBUG:")
-    print("=" * 50)
-    print(f"Timestamp: {datetime.now().isoformat()}")
-    print(f"Data: {json.dumps(response_data, indent=2, default=str)}")
-    print("=" * 50)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("📤 %s DEBUG: %s", label, _to_json(response_data))
 
 def debug_database_operation(operation: str, table: str, data: Dict[str, Any] = None):
     """Debug helper to log database operations"""
-    print(f"\n🗄️ DATABASE DEBUG:")
-    print("=" * 50)
-    print(f"Operation: {operation}")
-    print(f"Table: {table}")
-    if data:
-        print(f"Data: {json.dumps(data, indent=2, default=str)}")
-    print("=" * 50)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🗄️ DATABASE DEBUG: %s on %s%s", operation, table,
+                     f" with {_to_json(data)}" if data else "")
 
 def debug_file_operation(operation: str, file_path: str, file_size: int = None):
     """Debug helper to log file operations"""
-    print(f"\n📁 FILE DEBUG:")
-    print("=" * 50)
-    print(f"Operation: {operation}")
-    print(f"File: {file_path}")
-    if file_size:
-        print(f"Size: {file_size} bytes")
-    print("=" * 50)
+    logger.debug("📁 FILE DEBUG: %s %s%s", operation, file_path,
+                 f" ({file_size} bytes)" if file_size else "")
 
 def debug_error(error: Exception, context: str = ""):
     """Debug helper to log errors"""
-    print(f"\n❌ ERROR DEBUG:")
-    print("=" * 50)
-    print(f"Context: {context}")
-    print(f"Error Type: {type(error).__name__}")
-    print(f"Error Message: {str(error)}")
-    print("=" * 50)
+    logger.debug("❌ ERROR DEBUG: %s: %s: %s", context, type(error).__name__, error)
 
 # Example usage in your code:
 """
@@ -69,7 +53,7 @@ async def upload_invoice(file: UploadFile):
     debug_request({
         "filename": file.filename,
         "content_type": file.content_type,
-        "size": len(await file.read())
+        "size": file.size
     }, "INVOICE UPLOAD")
     
     # Your processing logic here...
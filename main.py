@@ -1,29 +1,46 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, Request, UploadFile, File, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import uvicorn
 import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from app.routers import invoice_router, bank_statement_router
 from app.config import settings
-from app.middleware import DebugMiddleware
+from app.database import db
+from app.executor import parser_pool
+from app.jobs import parse_queue
+from app.middleware import DebugMiddleware, UploadSizeLimitMiddleware
 
-# Configure logging
+# Configure logging. Records are only queued on the calling thread; a
+# listener thread does the console and file writes, so logging never
+# blocks the event loop
+log_queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, logging.StreamHandler(), logging.FileHandler('app.log'))
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=logging.DEBUG if settings.debug else logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('app.log')
-    ]
+    handlers=[QueueHandler(log_queue)]
 )
+log_listener.start()
 
 app = FastAPI(
     title="TrustBooks Backend",
     description="File parsing and storage API for invoices and bank statements",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# Add debug middleware
-# app.add_middleware(DebugMiddleware)
+# Request/response logging is opt-in (DEBUG=true), as it costs every request
+if settings.debug:
+    app.add_middleware(DebugMiddleware)
+
+# Turn away oversized uploads before their body is read
+app.add_middleware(UploadSizeLimitMiddleware, max_file_size=settings.max_file_size)
 
 # CORS middleware
 app.add_middleware(
@@ -38,6 +55,37 @@ app.add_middleware(
 app.include_router(invoice_router.router, prefix="/api/v1", tags=["invoices"])
 app.include_router(bank_statement_router.router, prefix="/api/v1", tags=["bank-statements"])
 
+# Error responses bypass default_response_class, so the default handlers
+# are replaced to encode them with orjson as well
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    return ORJSONResponse(
+        {"detail": exc.detail}, status_code=exc.status_code, headers=getattr(exc, "headers", None)
+    )
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    return ORJSONResponse({"detail": jsonable_encoder(exc.errors())}, status_code=422)
+
+@app.on_event("startup")
+async def startup():
+    # Start the worker processes used for statement parsing
+    parser_pool.start()
+    # Connect to the parse queue, if one is configured
+    await parse_queue.start()
+    # The parsers and the Gemini client are loaded by the first parse, not
+    # here, so server processes that never parse (e.g. with queue workers
+    # configured) never load them; the queue workers warm up on startup
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Close the pooled Supabase connections, the queue and parser workers
+    await db.close()
+    await parse_queue.close()
+    parser_pool.shutdown()
+    # Flush the queued log records
+    log_listener.stop()
+
 @app.get("/")
 async def root():
     return {"message": "TrustBooks Backend API", "version": "1.0.0"}
@@ -47,4 +95,19 @@ async def health_check():
     return {"status": "healthy"}
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    if settings.debug:
+        # The reloader runs a single process on the default loop
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    else:
+        # Inherited by the server processes, whose settings then split the
+        # CPUs between their parser pools
+        os.environ["MULTIPROCESS_SERVER"] = "1"
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=settings.server_workers,
+            loop="uvloop",
+            http="httptools",
+            access_log=False
+        ) 
\ No newline at end of file
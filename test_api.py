@@ -4,76 +4,78 @@ Simple test script for TrustBooks Backend API
 Run this after starting the server to test the endpoints
 """
 
-import requests
+import asyncio
+import httpx
 import json
 import os
 from pathlib import Path
 
 # API base URL
-BASE_URL = "http://localhost:8000/api/v1"
+SERVER_URL = "http://localhost:8000"
+BASE_URL = "/api/v1"
 
-def test_health_check():
+async def test_health_check(client: httpx.AsyncClient):
     """Test the health check endpoint"""
     try:
-        response = requests.get("http://localhost:8000/health")
+        response = await client.get("/health")
         print(f"✅ Health check: {response.status_code} - {response.json()}")
         return True
     except Exception as e:
         print(f"❌ Health check failed: {e}")
         return False
 
-def test_root_endpoint():
+async def test_root_endpoint(client: httpx.AsyncClient):
     """Test the root endpoint"""
     try:
-        response = requests.get("http://localhost:8000/")
+        response = await client.get("/")
         print(f"✅ Root endpoint: {response.status_code} - {response.json()}")
         return True
     except Exception as e:
         print(f"❌ Root endpoint failed: {e}")
         return False
 
-def test_invoice_endpoints():
+async def test_invoice_endpoints(client: httpx.AsyncClient):
     """Test invoice-related endpoints"""
     try:
-        # Test GET /invoices
-        response = requests.get(f"{BASE_URL}/invoices")
-        print(f"✅ GET /invoices: {response.status_code}")
-        
-        # Test GET /invoices/{id} (should return 404 for non-existent ID)
-        response = requests.get(f"{BASE_URL}/invoices/non-existent-id")
-        print(f"✅ GET /invoices/{{id}} (404 expected): {response.status_code}")
+        # Test GET /invoices and GET /invoices/{id} (should return 404 for non-existent ID)
+        listing, missing = await asyncio.gather(
+            client.get(f"{BASE_URL}/invoices"),
+            client.get(f"{BASE_URL}/invoices/non-existent-id")
+        )
+        print(f"✅ GET /invoices: {listing.status_code}")
+        print(f"✅ GET /invoices/{{id}} (404 expected): {missing.status_code}")
         
         return True
     except Exception as e:
         print(f"❌ Invoice endpoints failed: {e}")
         return False
 
-def test_bank_statement_endpoints():
+async def test_bank_statement_endpoints(client: httpx.AsyncClient):
     """Test bank statement-related endpoints"""
     try:
-        # Test GET /bank-statements
-        response = requests.get(f"{BASE_URL}/bank-statements")
-        print(f"✅ GET /bank-statements: {response.status_code}")
-        
-        # Test GET /bank-statements/{id} (should return 404 for non-existent ID)
-        response = requests.get(f"{BASE_URL}/bank-statements/non-existent-id")
-        print(f"✅ GET /bank-statements/{{id}} (404 expected): {response.status_code}")
+        # Test GET /bank-statements and GET /bank-statements/{id} (should return 404 for non-existent ID)
+        listing, missing = await asyncio.gather(
+            client.get(f"{BASE_URL}/bank-statements"),
+            client.get(f"{BASE_URL}/bank-statements/non-existent-id")
+        )
+        print(f"✅ GET /bank-statements: {listing.status_code}")
+        print(f"✅ GET /bank-statements/{{id}} (404 expected): {missing.status_code}")
         
         return True
     except Exception as e:
         print(f"❌ Bank statement endpoints failed: {e}")
         return False
 
-def test_file_upload_endpoints():
+async def test_file_upload_endpoints(client: httpx.AsyncClient):
     """Test file upload endpoints (without actual files)"""
     try:
-        # Test invoice upload endpoint (should fail without file)
-        response = requests.post(f"{BASE_URL}/upload-invoice")
-        print(f"✅ POST /upload-invoice (400 expected without file): {response.status_code}")
-        
-        # Test bank statement upload endpoint (should fail without file)
-        response = requests.post(f"{BASE_URL}/upload-bank-statement")
-        print(f"✅ POST /upload-bank-statement (400 expected without file): {response.status_code}")
+        # Test both upload endpoints (should fail without file)
+        invoice, statement = await asyncio.gather(
+            client.post(f"{BASE_URL}/upload-invoice"),
+            client.post(f"{BASE_URL}/upload-bank-statement")
+        )
+        print(f"✅ POST /upload-invoice (400 expected without file): {invoice.status_code}")
+        print(f"✅ POST /upload-bank-statement (400 expected without file): {statement.status_code}")
         
         return True
     except Exception as e:
@@ -96,32 +98,32 @@ def create_test_files():
     print(f"✅ Created test files in {test_dir}")
     return test_dir
 
-def test_with_sample_files():
+async def test_with_sample_files(client: httpx.AsyncClient):
     """Test upload endpoints with sample files"""
     test_dir = create_test_files()
     
     try:
         # Test bank statement upload with CSV
         with open(test_dir / "test_statement.csv", "rb") as f:
-            files = {"file": ("test_statement.csv", f, "text/csv")}
-            response = requests.post(f"{BASE_URL}/upload-bank-statement", files=files)
-            
-            if response.status_code == 200:
-                result = response.json()
-                print(f"✅ Bank statement upload successful: {result['file_id']}")
-                print(f"   Status: {result['status']}")
-                print(f"   Message: {result['message']}")
-            else:
-                print(f"⚠️ Bank statement upload failed: {response.status_code}")
-                print(f"   Response: {response.text}")
+            files = {"file": ("test_statement.csv", f.read(), "text/csv")}
+        response = await client.post(f"{BASE_URL}/upload-bank-statement", files=files)
+        
+        if response.status_code == 200:
+            result = response.json()
+            print(f"✅ Bank statement upload successful: {result['file_id']}")
+            print(f"   Status: {result['status']}")
+            print(f"   Message: {result['message']}")
+        else:
+            print(f"⚠️ Bank statement upload failed: {response.status_code}")
+            print(f"   Response: {response.text}")
         
         return True
     except Exception as e:
         print(f"❌ Sample file upload failed: {e}")
         return False
 
-def main():
-    """Run all tests"""
+async def main():
+    """Run all tests concurrently"""
     print("🚀 Testing TrustBooks Backend API")
     print("=" * 50)
     
@@ -134,15 +136,16 @@ def main():
         ("Sample File Upload", test_with_sample_files),
     ]
     
-    passed = 0
+    # The tests are independent, so the run takes as long as the slowest
+    # one rather than the sum of them; their output can interleave
+    async with httpx.AsyncClient(base_url=SERVER_URL) as client:
+        results = await asyncio.gather(*(test_func(client) for _, test_func in tests))
+    
+    passed = sum(results)
     total = len(tests)
     
-    for test_name, test_func in tests:
-        print(f"\n📋 Testing: {test_name}")
-        print("-" * 30)
-        if test_func():
-            passed += 1
-        else:
+    for (test_name, _), ok in zip(tests, results):
+        if not ok:
             print(f"❌ {test_name} failed")
     
     print("\n" + "=" * 50)
@@ -159,4 +162,4 @@ def main():
     print("3. Check the database to see parsed results")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""Half-open behaviour of the Supabase circuit breaker"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.database import CircuitBreaker, ServiceUnavailableError, db
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    """Route requests to a handler that answers with the queued statuses,
+    holding each response until ``release`` is set"""
+    state = {"statuses": [], "sent": 0, "release": None}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["sent"] += 1
+        await state["release"].wait()
+        return httpx.Response(state["statuses"].pop(0), content=b"")
+
+    original = db.client
+    db.client = httpx.AsyncClient(base_url="http://supabase", transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(db, "breaker", CircuitBreaker(fail_max=1, reset_timeout=0))
+    yield state
+    db.client = original
+
+
+async def _trial(supabase, status, callers=5):
+    """Open the circuit, then send ``callers`` concurrent requests once it is half-open"""
+    supabase["release"] = asyncio.Event()
+    supabase["release"].set()
+    supabase["statuses"] = [503]
+    with pytest.raises(httpx.HTTPStatusError):
+        await db.rpc("f", {})
+
+    supabase["release"] = asyncio.Event()
+    supabase["statuses"] = [status]
+    supabase["sent"] = 0
+    calls = [asyncio.create_task(db.rpc("f", {})) for _ in range(callers)]
+    await asyncio.sleep(0)
+    supabase["release"].set()
+    return await asyncio.gather(*calls, return_exceptions=True)
+
+
+def test_half_open_admits_a_single_trial(supabase):
+    results = asyncio.run(_trial(supabase, 200))
+    assert supabase["sent"] == 1
+    assert results[0] is None
+    assert all(isinstance(result, ServiceUnavailableError) for result in results[1:])
+    # The trial succeeded, so the circuit is closed again
+    db.breaker.before_call()
+
+
+def test_failed_trial_reopens_circuit(supabase):
+    results = asyncio.run(_trial(supabase, 503, callers=1))
+    assert isinstance(results[0], httpx.HTTPStatusError)
+    db.breaker.reset_timeout = 60
+    with pytest.raises(ServiceUnavailableError):
+        db.breaker.before_call()
+
+
+def test_rejected_trial_closes_circuit(supabase):
+    # A 4xx means Supabase answered, so the trial is not held forever
+    results = asyncio.run(_trial(supabase, 400))
+    assert isinstance(results[0], httpx.HTTPStatusError)
+    db.breaker.before_call()
+
+
+def test_cancelled_trial_is_released(supabase):
+    async def cancel_trial():
+        supabase["release"] = asyncio.Event()
+        db.breaker.record_failure()
+        trial = asyncio.create_task(db.rpc("f", {}))
+        await asyncio.sleep(0)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(cancel_trial())
+    db.breaker.before_call()
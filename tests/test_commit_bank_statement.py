@@ -0,0 +1,83 @@
+"""Shape of the rows sent to the commit_bank_statement RPC"""
+import asyncio
+import re
+from pathlib import Path
+
+import httpx
+import orjson
+import pandas as pd
+import pytest
+
+from app.database import BULK_CHUNK_SIZE, db
+from app.parsers.bank_statement_parser import BankStatementParser
+from app.routers.bank_statement_router import _store_transactions
+
+SCHEMA = Path(__file__).resolve().parent.parent / "database_schema.sql"
+
+CSV = (
+    b"Date,Narration,Withdrawal Amt.,Deposit Amt.,Closing Balance\n"
+    b"01/04/24,Opening transfer,10.50,,100\n"
+    b"02/04/24,Salary,,5000,5100\n"
+)
+
+
+def _rpc_columns():
+    """Keys the commit_bank_statement function accepts in its rows"""
+    sql = SCHEMA.read_text()
+    function = sql[sql.index("FUNCTION commit_bank_statement"):]
+    allowed = re.search(r"ARRAY\[([^\]]*)\]", function).group(1)
+    return set(re.findall(r"'(\w+)'", allowed))
+
+
+@pytest.fixture
+def requests_sent():
+    """Replace the Supabase client with one that records every request"""
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append((request.url.path, orjson.loads(request.content)))
+        return httpx.Response(201, content=b"")
+
+    original = db.client
+    db.client = httpx.AsyncClient(base_url="http://supabase", transport=httpx.MockTransport(handler))
+    yield sent
+    db.client = original
+
+
+@pytest.fixture
+def parser(monkeypatch):
+    # The Gemini client is built with the parser but never called here
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    return BankStatementParser()
+
+
+def test_rpc_rows_use_table_columns(parser, requests_sent):
+    transactions = pd.concat(parser.iter_csv_statement(CSV), ignore_index=True)
+    asyncio.run(_store_transactions("file-1", "bank_statements/file-1_s.csv", transactions, "raw"))
+
+    assert len(requests_sent) == 1
+    path, body = requests_sent[0]
+    assert path == "/rest/v1/rpc/commit_bank_statement"
+    assert body["p_file_id"] == "file-1"
+    assert body["p_raw_text"] == "raw"
+
+    rows = body["p_rows"]
+    assert len(rows) == len(transactions)
+    columns = _rpc_columns()
+    for row in rows:
+        assert set(row) <= columns
+    assert [row["txn_date"] for row in rows] == ["2024-04-01", "2024-04-02"]
+    assert [row["id"] for row in rows] == ["file-1_txn_0", "file-1_txn_1"]
+    assert rows[0]["debit"] == 10.5 and rows[0]["credit"] is None
+
+
+def test_large_statement_sends_last_chunk_through_rpc(requests_sent):
+    rows = [{"date": "2024-04-01", "debit": 1.0} for _ in range(BULK_CHUNK_SIZE + 1)]
+    asyncio.run(_store_transactions("file-2", "bank_statements/file-2_s.csv", rows))
+
+    (insert_path, inserted), (rpc_path, body) = requests_sent
+    assert insert_path == "/rest/v1/bank_statements"
+    assert len(inserted) == BULK_CHUNK_SIZE
+    assert rpc_path == "/rest/v1/rpc/commit_bank_statement"
+    assert [row["id"] for row in body["p_rows"]] == [f"file-2_txn_{BULK_CHUNK_SIZE}"]
+    assert all("date" not in row and row["txn_date"] == "2024-04-01" for row in inserted + body["p_rows"])
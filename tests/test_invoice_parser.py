@@ -0,0 +1,85 @@
+"""Regex short-circuit of the invoice parser on realistic invoice text"""
+import pytest
+
+from app.parsers.base_parser import BaseParser
+from app.parsers.invoice_parser import InvoiceData, InvoiceParser
+
+TAX_INVOICE = """TAX INVOICE
+Acme Traders Pvt Ltd
+GSTIN: 29ABCDE1234F1Z5
+Invoice Number: INV-001
+Invoice Date: 05/01/2024
+
+Item                Qty   Rate     Amount
+Printer paper A4    10    100.00   1,000.00
+
+Subtotal: 1,000.00
+CGST + SGST: 180.00
+Grand Total: 1,180.00
+"""
+
+INVOICE_NO = """TAX INVOICE
+Invoice No: 42
+Sub Total: 900.00
+Total: 1,062.00
+"""
+
+NO_NUMBER = """TAX INVOICE
+Acme Traders Pvt Ltd
+Invoice Date: 2024-01-05
+Subtotal: 1,000.00
+"""
+
+
+class FakeChain:
+    """Stands in for the Gemini chain and records every call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def invoke(self, inputs):
+        self.calls.append(inputs)
+        return InvoiceData(vendor_name="Acme Traders Pvt Ltd", invoice_date="2024-01-05")
+
+
+@pytest.fixture
+def parser(monkeypatch):
+    # The Gemini client is built with the parser but never called here
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(BaseParser, "_llm_cache", {})
+    parser = InvoiceParser()
+    parser._chain = FakeChain()
+    return parser
+
+
+@pytest.mark.parametrize("text, number, total", [
+    (TAX_INVOICE, "INV-001", 1180.0),
+    (INVOICE_NO, "42", 1062.0),
+    ("Invoice #: A-77/2024\nTotal Amount: 500", "A-77/2024", 500.0),
+    ("Bill No. 9981\nAmount: 12.50", "9981", 12.5),
+])
+def test_fallback_reads_labelled_number_and_total(parser, text, number, total):
+    data = parser._fallback_parse(text)
+    assert data["invoice_number"] == number
+    assert data["invoice_total"] == total
+
+
+def test_fallback_ignores_headings_and_subtotals(parser):
+    assert parser._fallback_parse(NO_NUMBER) == {}
+
+
+def test_gst_amount(parser):
+    assert parser._fallback_parse(TAX_INVOICE)["gst_amount"] == 180.0
+
+
+def test_complete_invoice_skips_llm(parser):
+    data = parser._parse_content(TAX_INVOICE)
+    assert data["invoice_number"] == "INV-001"
+    assert parser._chain.calls == []
+
+
+def test_incomplete_invoice_asks_llm(parser):
+    data = parser._parse_content(NO_NUMBER)
+    assert len(parser._chain.calls) == 1
+    assert data["vendor_name"] == "Acme Traders Pvt Ltd"
+    assert "invoice_number" not in data
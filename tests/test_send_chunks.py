@@ -0,0 +1,32 @@
+"""Failure handling of the concurrent bulk chunk sender"""
+import asyncio
+
+import pytest
+
+from app.database import BULK_CHUNK_SIZE, BULK_MAX_CONCURRENCY, db
+
+
+def test_failed_chunk_waits_for_in_flight_chunks():
+    started, finished = [], []
+
+    async def send_chunk(chunk):
+        index = chunk[0]["chunk"]
+        started.append(index)
+        if index == 0:
+            await asyncio.sleep(0.01)
+            raise ValueError("rejected")
+        await asyncio.sleep(0.05)
+        finished.append(index)
+        return chunk
+
+    async def run():
+        rows = [{"chunk": n // BULK_CHUNK_SIZE} for n in range(BULK_CHUNK_SIZE * BULK_MAX_CONCURRENCY * 2)]
+        with pytest.raises(ValueError):
+            await db._send_chunks(rows, send_chunk)
+        # Every chunk in flight at the failure completed before it was raised
+        assert sorted(finished) == list(range(1, BULK_MAX_CONCURRENCY))
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    # No worker picked up a further chunk after the failure
+    assert sorted(started) == list(range(BULK_MAX_CONCURRENCY))